@@ -8,7 +8,7 @@ import time
 import traceback
 from io import StringIO
 
-from psycopg2 import OperationalError, errorcodes
+from psycopg2 import OperationalError, errorcodes, errors
 from werkzeug.exceptions import BadRequest, Forbidden
 
 from odoo import SUPERUSER_ID, _, api, http, registry, tools
@@ -17,6 +17,7 @@ from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
 from ..delay import chain, group
 from ..exception import FailedJobError, NothingToDoJob, RetryableJobError
 from ..job import ENQUEUED, Job
+from ..models.queue_job import IDENTITY_KEY_UNIQUE_INDEX
 
 _logger = logging.getLogger(__name__)
 
@@ -47,12 +48,19 @@ class RunJobController(http.Controller):
         tries = 0
         while True:
             try:
+                # the job is committed as done: resolve its dependencies in a
+                # new read committed transaction, where the counters of the
+                # children finished by concurrent parents are updated in turn
+                # instead of failing on serialization errors
+                env.cr.commit()
+                env.cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
                 job.enqueue_waiting()
             except OperationalError as err:
                 # Automatically retry the typical transaction serialization
                 # errors
                 if err.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
                     raise
+                env.cr.rollback()
                 if tries >= DEPENDS_MAX_TRIES_ON_CONCURRENCY_FAILURE:
                     _logger.info(
                         "%s, maximum number of tries reached to update dependencies",
@@ -76,6 +84,15 @@ class RunJobController(http.Controller):
     def runjob(self, db, job_uuid, **kw):
         http.request.session.db = db
         env = http.request.env(user=SUPERUSER_ID)
+        self._runjob(env, job_uuid)
+        return ""
+
+    def _runjob(self, env, job_uuid):
+        """Run an enqueued job
+
+        Used by the ``/queue_job/runjob`` route, and by the worker processes
+        of the job runner when it runs the jobs without HTTP requests.
+        """
 
         def retry_postpone(job, message, seconds=None):
             job.env.clear()
@@ -83,24 +100,40 @@ class RunJobController(http.Controller):
                 job.env = api.Environment(new_cr, SUPERUSER_ID, {})
                 job.postpone(result=message, seconds=seconds)
                 job.set_pending(reset_retry=False)
-                job.store()
+                try:
+                    with new_cr.savepoint():
+                        job.store()
+                except errors.UniqueViolation as err:
+                    if err.diag.constraint_name != IDENTITY_KEY_UNIQUE_INDEX:
+                        raise
+                    # a job with the same identity key has been enqueued while
+                    # this one was running: the row is left failed
+                    job._stored_values = None
+                    job.set_failed(
+                        exc_message=_(
+                            "Not retried, another job with the identity key %s "
+                            "is waiting to be executed"
+                        )
+                        % job.identity_key
+                    )
+                    job.store()
 
         # ensure the job to run is in the correct state and lock the record
-        env.cr.execute(
-            "SELECT state FROM queue_job WHERE uuid=%s AND state=%s FOR UPDATE",
-            (job_uuid, ENQUEUED),
-        )
-        if not env.cr.fetchone():
+        job = Job.load_for_update(env, job_uuid, state=ENQUEUED)
+        if not job:
             _logger.warning(
                 "was requested to run job %s, but it does not exist, "
                 "or is not in state %s",
                 job_uuid,
                 ENQUEUED,
             )
-            return ""
+            return
 
-        job = Job.load(env, job_uuid)
-        assert job and job.state == ENQUEUED
+        assert job.state == ENQUEUED
+        if job.coalesce():
+            _logger.debug(
+                "%s executed with %d coalesced jobs", job, len(job.coalesced_jobs)
+            )
 
         try:
             try:
@@ -133,7 +166,7 @@ class RunJobController(http.Controller):
             # traceback in the logs we should have the traceback when all
             # retries are exhausted
             env.cr.rollback()
-            return ""
+            return
 
         except (FailedJobError, Exception) as orig_exception:
             buff = StringIO()
@@ -153,8 +186,6 @@ class RunJobController(http.Controller):
         self._enqueue_dependent_jobs(env, job)
         _logger.debug("%s enqueue depends done", job)
 
-        return ""
-
     def _get_failure_values(self, job, traceback_txt, orig_exception):
         """Collect relevant data from exception."""
         exception_name = orig_exception.__class__.__name__
@@ -303,7 +334,11 @@ class RunJobController(http.Controller):
                 tail_delayable.on_done(delayable)
             tails.append(delayable)
 
+        start = time.time()
         root_delayable.delay()
+        _logger.info(
+            "graph of %d test jobs delayed in %.2f seconds", size, time.time() - start
+        )
 
         return "graph uuid: %s" % (
             list(root_delayable._head())[0]._generated_job.graph_uuid,
@@ -264,32 +264,57 @@ class DelayableGraph(Graph):
         for vertex, neighbour in graph.edges():
             neighbour._generated_job.add_depends({vertex._generated_job})
 
+        debounce = 0
+        if len(vertices) == 1:
+            job_ = vertices[0]._generated_job
+            debounce = job_.debounce
+            if debounce and not job_.eta:
+                job_.eta = debounce
+            if job_.has_unique_identity_key():
+                # the unique index on the identity keys lets the job create
+                # itself, and fall back on the existing job on conflict
+                job_.store()
+                existing = job_.existing_identity_record
+                if existing:
+                    if debounce:
+                        existing._debounce(debounce, job_.job_config.debounce_max_delay)
+                    vertices[0]._generated_job = existing
+                return
+
         # If all the jobs of the graph have another job with the same identity,
         # we do not create them. Maybe we should check that the found jobs are
         # part of the same graph, but not sure it's really required...
         # Also, maybe we want to check only the root jobs.
         existing_mapping = {}
-        for vertex in vertices:
-            if not vertex.identity_key:
-                continue
-            generated_job = vertex._generated_job
-            existing = generated_job.job_record_with_same_identity_key()
-            if not existing:
-                # at least one does not exist yet, we'll delay the whole graph
-                existing_mapping.clear()
-                break
-            existing_mapping[vertex] = existing
+        identity_vertices = [vertex for vertex in vertices if vertex.identity_key]
+        if identity_vertices:
+            # look for all the identity keys at once
+            job_model = identity_vertices[0]._generated_job.env["queue.job"]
+            existing_by_key = job_model._get_jobs_by_identity_key(
+                [vertex._generated_job.identity_key for vertex in identity_vertices]
+            )
+            for vertex in identity_vertices:
+                existing = existing_by_key.get(vertex._generated_job.identity_key)
+                if not existing:
+                    # at least one does not exist yet, we'll delay the whole graph
+                    existing_mapping.clear()
+                    break
+                existing_mapping[vertex] = existing
 
         # We'll replace the generated jobs by the existing ones, so callers
         # can retrieve the existing job in "_generated_job".
         # existing_mapping contains something only if *all* the job with an
         # identity have an existing one.
         for vertex, existing in existing_mapping.items():
+            if debounce:
+                existing._debounce(
+                    debounce, vertex._generated_job.job_config.debounce_max_delay
+                )
             vertex._generated_job = existing
+        if existing_mapping:
             return
 
-        for vertex in vertices:
-            vertex._generated_job.store()
+        Job.store_many([vertex._generated_job for vertex in vertices])
 
     def _execute_graph_direct(self, graph):
         for delayable in graph.topological_sort():
@@ -439,6 +464,7 @@ class Delayable:
         "description",
         "channel",
         "identity_key",
+        "debounce",
     )
     __slots__ = _properties + (
         "recordset",
@@ -447,6 +473,7 @@ class Delayable:
         "_job_args",
         "_job_kwargs",
         "_generated_job",
+        "_split",
     )
 
     def __init__(
@@ -458,6 +485,7 @@ class Delayable:
         description=None,
         channel=None,
         identity_key=None,
+        debounce=None,
     ):
         self._graph = DelayableGraph()
         self._graph.add_vertex(self)
@@ -470,12 +498,15 @@ class Delayable:
         self.description = description
         self.channel = channel
         self.identity_key = identity_key
+        self.debounce = debounce
 
         self._job_method = None
         self._job_args = ()
         self._job_kwargs = {}
 
         self._generated_job = None
+        # replaced by the delayables of its chunks, see ``split``
+        self._split = False
 
     def _head(self):
         return [self]
@@ -492,7 +523,7 @@ class Delayable:
         )
 
     def __del__(self):
-        if not self._generated_job:
+        if not self._generated_job and not self._split:
             _logger.warning("Delayable %s was prepared but never delayed", self)
 
     def _set_from_dict(self, properties):
@@ -527,6 +558,11 @@ class Delayable:
         self._graph.delay()
 
     def _build_job(self):
+        if self._split:
+            raise ValueError(
+                "Delayable %s was split, the delayables of its chunks must be "
+                "delayed instead" % (self,)
+            )
         if self._generated_job:
             return self._generated_job
         self._generated_job = Job(
@@ -540,8 +576,77 @@ class Delayable:
             channel=self.channel,
             identity_key=self.identity_key,
         )
+        if self.debounce is not None:
+            self._generated_job.debounce = self.debounce
         return self._generated_job
 
+    def split(self, size, chain=False):
+        """Split the Delayable in delayables of ``size`` records
+
+        The recordset of the Delayable is sliced in chunks of ``size``
+        records, each chunk being delayed as one job calling the same method
+        with the same arguments and properties. The description of the jobs
+        is suffixed by the index of the chunk.
+
+        Returns a :class:`~DelayableGroup`, or a :class:`~DelayableChain`
+        when ``chain`` is True, so the chunks can be connected to other
+        delayables using ``on_done``::
+
+            records.delayable().do_something().split(1000).on_done(
+                records.delayable().send_report()
+            ).delay()
+
+        The jobs of the chunks are created together when the graph is
+        delayed. The Delayable itself cannot be delayed anymore, so it must
+        be split before being connected to other delayables.
+        """
+        if not self._job_method:
+            raise ValueError("No method set on the Delayable")
+        if self._graph.vertices() != {self}:
+            raise ValueError(
+                "Cannot split a Delayable connected to other delayables, "
+                "connect the result of split() instead"
+            )
+        if size < 1:
+            raise ValueError("The size of the chunks must be at least 1")
+        if not self.recordset:
+            raise ValueError("Cannot split a Delayable without records")
+
+        method_name = self._job_method.__name__
+        delayables = []
+        for index in range(0, len(self.recordset), size):
+            recordset = self.recordset[index : index + size]
+            delayable = Delayable(
+                recordset,
+                priority=self.priority,
+                eta=self.eta,
+                max_retries=self.max_retries,
+                channel=self.channel,
+                identity_key=self.identity_key,
+                debounce=self.debounce,
+            )
+            delayable._job_method = getattr(recordset, method_name)
+            delayable._job_args = self._job_args
+            delayable._job_kwargs = self._job_kwargs
+            delayables.append(delayable)
+
+        if self.description:
+            description = self.description
+        elif self._job_method.__doc__:
+            description = self._job_method.__doc__.splitlines()[0].strip()
+        else:
+            description = "{}.{}".format(self.recordset._name, method_name)
+        for index, delayable in enumerate(delayables, start=1):
+            delayable.description = "{} (split {}/{})".format(
+                description, index, len(delayables)
+            )
+
+        # the chunks replace this delayable, which is never delayed itself
+        self._split = True
+        if chain:
+            return DelayableChain(*delayables)
+        return DelayableGroup(*delayables)
+
     def _store_args(self, *args, **kwargs):
         self._job_args = args
         self._job_kwargs = kwargs
@@ -589,6 +694,7 @@ class DelayableRecordset(object):
         description=None,
         channel=None,
         identity_key=None,
+        debounce=None,
     ):
         self.delayable = Delayable(
             recordset,
@@ -598,6 +704,7 @@ class DelayableRecordset(object):
             description=description,
             channel=channel,
             identity_key=identity_key,
+            debounce=debounce,
         )
 
     @property
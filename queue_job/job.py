@@ -35,9 +35,47 @@ STATES = [
 ]
 
 DEFAULT_PRIORITY = 10  # used by the PriorityQueue to sort the jobs
+STORE_CHUNK_SIZE = 1000  # number of jobs created at once by store_many
 DEFAULT_MAX_RETRIES = 5
 RETRY_INTERVAL = 10 * 60  # seconds
 
+# fields written by ``Job.store`` on an existing job, compared to the values
+# read or written last to only write the changed ones
+STORE_FIELDS = (
+    "state",
+    "priority",
+    "retry",
+    "max_retries",
+    "exc_name",
+    "exc_message",
+    "exc_info",
+    "company_id",
+    "result",
+    "date_enqueued",
+    "date_started",
+    "date_done",
+    "exec_time",
+    "date_cancelled",
+    "eta",
+    "identity_key",
+    "worker_pid",
+    "graph_uuid",
+    "dependencies",
+)
+
+# fields read to build a job, see ``Job.load_for_update``
+LOAD_FIELDS = STORE_FIELDS + (
+    "uuid",
+    "name",
+    "model_name",
+    "method_name",
+    "records",
+    "args",
+    "kwargs",
+    "channel",
+    "date_created",
+)
+
 _logger = logging.getLogger(__name__)
 
 
@@ -229,6 +267,35 @@ class Job(object):
             )
         return cls._load_from_db_record(stored)
 
+    @classmethod
+    def load_for_update(cls, env, job_uuid, state=None):
+        """Lock and read a single job from the Database
+
+        The row is locked and all the fields needed to build the job are
+        read with a single query, the values are put in the cache of the
+        ``queue.job`` record so reading them does not query again.
+
+        Return None if the job does not exist or is not in ``state``.
+        """
+        query = "SELECT id, {} FROM queue_job WHERE uuid = %s".format(
+            ", ".join('"{}"'.format(name) for name in LOAD_FIELDS)
+        )
+        params = [job_uuid]
+        if state:
+            query += " AND state = %s"
+            params.append(state)
+        env.cr.execute(query + " FOR UPDATE", params)
+        row = env.cr.fetchone()
+        if not row:
+            return None
+        record = env["queue.job"].browse(row[0]).sudo()
+        for name, value in zip(LOAD_FIELDS, row[1:]):
+            field = record._fields[name]
+            env.cache.update(
+                record, field, [field.convert_to_cache(value, record, validate=False)]
+            )
+        return cls._load_from_db_record(record)
+
     @classmethod
     def load_many(cls, env, job_uuids):
         """Read jobs in batch from the Database
@@ -295,22 +362,30 @@ class Job(object):
         job_.__reverse_depends_on_uuids.update(
             stored.dependencies.get("reverse_depends_on", [])
         )
+        job_._stored_values = {
+            name: stored[name].id if name == "company_id" else stored[name]
+            for name in STORE_FIELDS
+        }
+        job_._stored_cr = job_.env.cr
         return job_
 
+    def has_unique_identity_key(self):
+        """Return whether the identity key is enforced by a unique index
+
+        Only the jobs out of a graph are concerned, when the
+        ``queue_job_identity_key_state_unique_index`` index exists.
+        """
+        return bool(
+            self.identity_key
+            and not self.graph_uuid
+            and self.env["queue.job"]._has_identity_key_unique_index()
+        )
+
     def job_record_with_same_identity_key(self):
         """Check if a job to be executed with the same key exists."""
-        existing = (
-            self.env["queue.job"]
-            .sudo()
-            .search(
-                [
-                    ("identity_key", "=", self.identity_key),
-                    ("state", "in", [WAIT_DEPENDENCIES, PENDING, ENQUEUED]),
-                ],
-                limit=1,
-            )
-        )
-        return existing
+        job_model = self.env["queue.job"].sudo()
+        existing = job_model._get_jobs_by_identity_key([self.identity_key])
+        return existing.get(self.identity_key, job_model.browse())
 
     # TODO to deprecate (not called anymore)
     @classmethod
@@ -500,6 +575,17 @@ class Job(object):
         self.eta = eta
         self.channel = channel
         self.worker_pid = None
+        # job with the same identity key found by ``store`` instead of
+        # creating this one, when the identity keys are unique
+        self.existing_identity_record = None
+        # pending jobs executed with this one, see ``coalesce``
+        self.coalesced_jobs = []
+        self._debounce = None
+        # values of the job in the database, None when it is not stored
+        self._stored_values = None
+        # cursor on which the values were read or written: they are not
+        # known anymore on another cursor, as they may have been rolled back
+        self._stored_cr = None
 
     def add_depends(self, jobs):
         if self in jobs:
@@ -539,37 +625,153 @@ class Job(object):
 
         return self.result
 
-    def enqueue_waiting(self):
-        sql = """
-            UPDATE queue_job
-            SET state = %s
-            FROM (
-            SELECT child.id, array_agg(parent.state) as parent_states
+    def coalesce(self):
+        """Claim the pending jobs to execute with this one
+
+        When the job function has a ``coalesce_limit``, up to this number of
+        jobs (this one included) calling the same method with the same
+        arguments, for the same user and company, with the same environment
+        (user, superuser flag and context) stored with their records, are
+        executed together: the method is called once on the union of their
+        records, and the claimed jobs follow the state of this job when it is
+        stored.
+
+        The claimed jobs are locked until the transaction is committed, the
+        job runner only enqueues jobs which are still pending.
+        """
+        limit = self.job_config.coalesce_limit
+        if limit <= 1 or self.graph_uuid:
+            return self.coalesced_jobs
+        self.env.cr.execute(
+            """
+            SELECT other.uuid
             FROM queue_job job
-            JOIN LATERAL
-              json_array_elements_text(
-                  job.dependencies::json->'reverse_depends_on'
-              ) child_deps ON true
-            JOIN queue_job child
-            ON child.graph_uuid = job.graph_uuid
-            AND child.uuid = child_deps
-            JOIN LATERAL
-                json_array_elements_text(
-                  child.dependencies::json->'depends_on'
-                ) parent_deps ON true
-            JOIN queue_job parent
-            ON parent.graph_uuid = job.graph_uuid
-            AND parent.uuid = parent_deps
+            JOIN queue_job other
+            ON other.model_name = job.model_name
+            AND other.method_name = job.method_name
+            AND other.args = job.args
+            AND other.kwargs = job.kwargs
+            AND other.user_id IS NOT DISTINCT FROM job.user_id
+            AND other.company_id IS NOT DISTINCT FROM job.company_id
+            -- the records are stored with the user, superuser flag and
+            -- context of their environment
+            AND (other.records::jsonb -> 'uid')
+                IS NOT DISTINCT FROM (job.records::jsonb -> 'uid')
+            AND (other.records::jsonb -> 'su')
+                IS NOT DISTINCT FROM (job.records::jsonb -> 'su')
+            AND COALESCE(other.records::jsonb -> 'context', '{}'::jsonb)
+                = COALESCE(job.records::jsonb -> 'context', '{}'::jsonb)
             WHERE job.uuid = %s
-            GROUP BY child.id
-            ) jobs
-            WHERE
-            queue_job.id = jobs.id
-            AND %s = ALL(jobs.parent_states)
-            AND state = %s;
+            AND other.id != job.id
+            AND other.state = %s
+            AND other.graph_uuid IS NULL
+            AND (other.eta IS NULL OR other.eta <= now() at time zone 'utc')
+            ORDER BY other.priority, other.date_created, other.id
+            LIMIT %s
+            FOR UPDATE OF other SKIP LOCKED
+            """,
+            (self.uuid, PENDING, limit - 1),
+        )
+        uuids = [row[0] for row in self.env.cr.fetchall()]
+        self.coalesced_jobs = list(self.load_many(self.env, uuids))
+        return self.coalesced_jobs
+
+    def _follow(self, job_):
+        """Copy the execution state of the job executing this coalesced job"""
+        self.env = job_.env
+        self.state = job_.state
+        self.retry = job_.retry
+        self.eta = job_.eta
+        self.date_enqueued = job_.date_enqueued
+        self.date_started = job_.date_started
+        self.date_done = job_.date_done
+        self.date_cancelled = job_.date_cancelled
+        self.exc_name = job_.exc_name
+        self.exc_message = job_.exc_message
+        self.exc_info = job_.exc_info
+        self.result = job_.result
+        self.worker_pid = job_.worker_pid
+
+    def enqueue_waiting(self):
+        """Resolve the dependencies of the children of the job once it is done
+
+        The edges of the job in ``queue_job_dependency`` are marked as done,
+        only once, and the counter of remaining dependencies of each child is
+        decremented. The children waiting for no other job are set to pending.
+        Each parent only updates its own edges and children, whatever the
+        number of parents of a child.
         """
-        self.env.cr.execute(sql, (PENDING, self.uuid, DONE, WAIT_DEPENDENCIES))
-        self.env["queue.job"].invalidate_model(["state"])
+        sql = """
+            WITH resolved AS (
+                UPDATE queue_job_dependency dep
+                SET done = true
+                FROM queue_job parent
+                WHERE parent.uuid = %s
+                AND parent.state = %s
+                AND dep.parent_id = parent.id
+                AND NOT dep.done
+                RETURNING dep.child_id
+            )
+            UPDATE queue_job child
+            SET dependencies_remaining = child.dependencies_remaining - 1,
+                state = CASE
+                    WHEN child.dependencies_remaining <= 1 AND child.state = %s
+                    THEN %s
+                    ELSE child.state
+                END
+            FROM resolved
+            WHERE child.id = resolved.child_id;
+        """
+        self.env.cr.execute(sql, (self.uuid, DONE, WAIT_DEPENDENCIES, PENDING))
+        self.env["queue.job"].invalidate_model(["state", "dependencies_remaining"])
+
+    @classmethod
+    def _store_dependencies(cls, env, jobs):
+        """Store the dependencies of the jobs in ``queue_job_dependency``
+
+        The missing edges between stored jobs are inserted, then the counter
+        of remaining dependencies is computed for the children of the new
+        edges. An edge is inserted as done when the parent is already done.
+        """
+        edges = set()
+        for job_ in jobs:
+            edges.update((parent, job_.uuid) for parent in job_.__depends_on_uuids)
+            edges.update(
+                (job_.uuid, child) for child in job_.__reverse_depends_on_uuids
+            )
+        if not edges:
+            return
+        env["queue.job"].flush_model()
+        parent_uuids, child_uuids = zip(*edges)
+        env.cr.execute(
+            """
+            INSERT INTO queue_job_dependency (parent_id, child_id, done)
+            SELECT parent.id, child.id, parent.state = %s
+            FROM unnest(%s::varchar[], %s::varchar[]) AS edge(parent, child)
+            JOIN queue_job parent ON parent.uuid = edge.parent
+            JOIN queue_job child ON child.uuid = edge.child
+            ON CONFLICT (parent_id, child_id) DO NOTHING
+            RETURNING child_id
+            """,
+            (DONE, list(parent_uuids), list(child_uuids)),
+        )
+        child_ids = list({row[0] for row in env.cr.fetchall()})
+        if not child_ids:
+            return
+        env.cr.execute(
+            """
+            UPDATE queue_job child
+            SET dependencies_remaining = (
+                SELECT count(*)
+                FROM queue_job_dependency dep
+                WHERE dep.child_id = child.id
+                AND NOT dep.done
+            )
+            WHERE child.id = ANY(%s)
+            """,
+            (child_ids,),
+        )
+        env["queue.job"].invalidate_model(["dependencies_remaining"])
 
     def store(self):
         """Store the Job"""
@@ -580,13 +782,97 @@ class Job(object):
 
         db_record = self.db_record()
         if db_record:
-            db_record.with_context(_job_edit_sentinel=edit_sentinel).write(
-                self._store_values()
-            )
+            vals = self._changed_store_values(db_record)
+            if vals:
+                if db_record._can_write_in_sql(vals):
+                    # started, done, ...: no need for the ORM
+                    db_record._write_in_sql(vals)
+                else:
+                    db_record.with_context(_job_edit_sentinel=edit_sentinel).write(vals)
+                self._stored_values.update(vals)
+            if "dependencies" in vals:
+                self._store_dependencies(self.env, [self])
+        elif self.has_unique_identity_key():
+            vals = self._store_values(create=True)
+            record, created = job_model.with_context(
+                _job_edit_sentinel=edit_sentinel
+            )._create_with_unique_identity_key(vals)
+            if created:
+                self._stored_values = vals
+                self._stored_cr = self.env.cr
+            else:
+                self.existing_identity_record = record
         else:
-            job_model.with_context(_job_edit_sentinel=edit_sentinel).sudo().create(
-                self._store_values(create=True)
-            )
+            vals = self._store_values(create=True)
+            job_model.with_context(_job_edit_sentinel=edit_sentinel).sudo().create(vals)
+            self._stored_values = vals
+            self._stored_cr = self.env.cr
+            self._store_dependencies(self.env, [self])
+        for coalesced_job in self.coalesced_jobs:
+            coalesced_job._follow(self)
+            coalesced_job.store()
+
+    @classmethod
+    def store_many(cls, jobs):
+        """Store several jobs
+
+        Same as calling :meth:`store` on each job, but the jobs which are not
+        stored yet are created together, by chunks of ``STORE_CHUNK_SIZE``,
+        instead of one ``create`` per job.
+        """
+        jobs_by_env = {}
+        for job in jobs:
+            jobs_by_env.setdefault(job.env, []).append(job)
+        for env, env_jobs in jobs_by_env.items():
+            job_model = env["queue.job"]
+            job_model = job_model.with_context(
+                _job_edit_sentinel=job_model.EDIT_SENTINEL
+            ).sudo()
+            stored_uuids = set()
+            for chunk in odoo.tools.split_every(STORE_CHUNK_SIZE, env_jobs):
+                stored_uuids.update(
+                    cls.db_records_from_uuids(env, [job.uuid for job in chunk]).mapped(
+                        "uuid"
+                    )
+                )
+            new_jobs = []
+            for job in env_jobs:
+                if job.uuid in stored_uuids:
+                    job.store()
+                else:
+                    new_jobs.append(job)
+            for chunk in odoo.tools.split_every(STORE_CHUNK_SIZE, new_jobs):
+                vals_list = [job._store_values(create=True) for job in chunk]
+                job_model.create(vals_list)
+                for job, vals in zip(chunk, vals_list):
+                    job._stored_values = vals
+                    job._stored_cr = env.cr
+            cls._store_dependencies(env, new_jobs)
+
+    def _changed_store_values(self, db_record):
+        """Return the values to write, changed since the job was read or stored
+
+        All the values are returned when the job has not been read from the
+        database, or when it was read or stored on another cursor, for
+        instance before a rollback. The values returned by the model
+        (``_job_store_values``) are compared to the ones of the record.
+        """
+        vals = self._store_values()
+        if self._stored_values is None or self._stored_cr is not self.env.cr:
+            self._stored_values = {}
+            self._stored_cr = self.env.cr
+            return vals
+        changed = {}
+        for name, value in vals.items():
+            if name not in self._stored_values:
+                stored_value = db_record[name]
+                if isinstance(stored_value, odoo.models.BaseModel):
+                    stored_value = stored_value.id
+                self._stored_values[name] = stored_value
+            # False, None, 0 or empty values are all stored as NULL or 0
+            if (value or False) != (self._stored_values[name] or False):
+                changed[name] = value
+        return changed
 
     def _store_values(self, create=False):
         vals = {
@@ -625,11 +911,10 @@ class Job(object):
         if self.identity_key:
             vals["identity_key"] = self.identity_key
 
+        # the uuids are enough, do not load the jobs of the graph
         dependencies = {
-            "depends_on": [parent.uuid for parent in self.depends_on],
-            "reverse_depends_on": [
-                children.uuid for children in self.reverse_depends_on
-            ],
+            "depends_on": sorted(self.__depends_on_uuids),
+            "reverse_depends_on": sorted(self.__reverse_depends_on_uuids),
         }
         vals["dependencies"] = dependencies
 
@@ -701,7 +986,10 @@ class Job(object):
 
     @property
     def func(self):
-        recordset = self.recordset.with_context(job_uuid=self.uuid)
+        recordset = self.recordset
+        for coalesced_job in self.coalesced_jobs:
+            recordset |= coalesced_job.recordset
+        recordset = recordset.with_context(job_uuid=self.uuid)
         return getattr(recordset, self.method_name)
 
     @property
@@ -780,6 +1068,23 @@ class Job(object):
         else:
             self._eta = value
 
+    @property
+    def debounce(self):
+        """Seconds by which a job with the same identity key is delayed
+
+        Only single jobs with an identity key are debounced. Use the debounce
+        window of the job function when not set on the job.
+        """
+        if not self.identity_key or self.graph_uuid:
+            return 0
+        if self._debounce is None:
+            return self.job_config.debounce_window
+        return self._debounce
+
+    @debounce.setter
+    def debounce(self, value):
+        self._debounce = value
+
     @property
     def channel(self):
         return self._channel or self.job_config.channel
@@ -2,8 +2,7 @@
 # Copyright 2015-2016 Camptocamp SA
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 import logging
-from functools import total_ordering
-from heapq import heappop, heappush
+from heapq import heapify, heappop, heappush
 from weakref import WeakValueDictionary
 
 from ..exception import ChannelNotFound
@@ -44,64 +43,83 @@ class PriorityQueue(object):
     >>> q.add(2)
     >>> q.pop()
     2
+
+    Objects are ordered by themselves, or by the tuple returned by ``key``
+    when given. The key is computed once, when the object is added, and is
+    stored in the heap along with the object: it must be given when the
+    order of the objects can change while they are in the heap.
+
+    >>> q = PriorityQueue(key=lambda o: (-o,))
+    >>> q.add(1)
+    >>> q.add(2)
+    >>> q.pop()
+    2
     """
 
-    def __init__(self):
+    # remove() only discards the object from the set of queued objects, its
+    # heap entry stays until it reaches the top of the heap; the heap is
+    # rebuilt when it holds too many of these stale entries
+    _COMPACT_MIN_SIZE = 1024
+
+    def __init__(self, key=None):
+        self._key = key
+        # objects, or key + (object,) tuples, including removed objects
         self._heap = []
-        self._known = set()  # all objects in the heap (including removed)
-        self._removed = set()  # all objects that have been removed
+        self._queued = set()  # objects in the queue
+
+    def _object(self, entry):
+        return entry if self._key is None else entry[-1]
 
     def __len__(self):
-        return len(self._known) - len(self._removed)
+        return len(self._queued)
 
     def __getitem__(self, i):
         if i != 0:
             raise IndexError()
+        heap = self._heap
+        queued = self._queued
         while True:
-            if not self._heap:
+            if not heap:
                 raise IndexError()
-            o = self._heap[0]
-            if o in self._removed:
-                o2 = heappop(self._heap)
-                assert o2 == o
-                self._removed.remove(o)
-                self._known.remove(o)
-            else:
+            o = self._object(heap[0])
+            if o in queued:
                 return o
+            heappop(heap)
 
     def __contains__(self, o):
-        return o in self._known and o not in self._removed
+        return o in self._queued
 
     def add(self, o):
         if o is None:
             raise ValueError()
-        if o in self._removed:
-            self._removed.remove(o)
-        if o in self._known:
+        if o in self._queued:
             return
-        self._known.add(o)
-        heappush(self._heap, o)
+        self._queued.add(o)
+        heappush(self._heap, o if self._key is None else self._key(o) + (o,))
 
     def remove(self, o):
         if o is None:
             raise ValueError()
-        if o not in self._known:
+        if o not in self._queued:
             return
-        if o not in self._removed:
-            self._removed.add(o)
+        self._queued.remove(o)
+        heap = self._heap
+        if len(heap) > self._COMPACT_MIN_SIZE and len(heap) > 2 * len(self._queued):
+            self._heap = [
+                entry for entry in heap if self._object(entry) in self._queued
+            ]
+            heapify(self._heap)
 
     def pop(self):
-        while True:
-            try:
-                o = heappop(self._heap)
-            except IndexError:
-                # queue is empty
-                return None
-            self._known.remove(o)
-            if o in self._removed:
-                self._removed.remove(o)
-            else:
+        heap = self._heap
+        queued = self._queued
+        while heap:
+            o = self._object(heappop(heap))
+            if o in queued:
+                queued.remove(o)
                 return o
+        # queue is empty
+        return None
 
 
 class SafeSet(set):
@@ -122,7 +140,6 @@ class SafeSet(set):
             pass
 
 
-@total_ordering
 class ChannelJob(object):
     """A channel job is attached to a channel and holds the properties of a
     job that are necessary to prioritise them.
@@ -191,8 +208,29 @@ class ChannelJob(object):
     >>> j1.sorting_key_ignoring_eta() < j2.sorting_key_ignoring_eta()
     True
 
+    The jobs are ordered by their sort key, the jobs without eta are compared
+    without building it:
+
+    >>> j4.sort_key()
+    (False, 9, 9, 4, 0)
+    >>> j1.sort_key()
+    (True, 0, 9, 1, 0)
+
     """
 
+    # there can be millions of channel jobs in memory, keep them small;
+    # __weakref__ is needed by ChannelManager._jobs_by_uuid
+    __slots__ = (
+        "db_name",
+        "channel",
+        "uuid",
+        "seq",
+        "date_created",
+        "priority",
+        "eta",
+        "__weakref__",
+    )
+
     def __init__(self, db_name, channel, uuid, seq, date_created, priority, eta):
         self.db_name = db_name
         self.channel = channel
@@ -205,11 +243,10 @@ class ChannelJob(object):
     def __repr__(self):
         return "<ChannelJob %s>" % self.uuid
 
-    def __eq__(self, other):
-        return id(self) == id(other)
-
-    def __hash__(self):
-        return id(self)
+    def sort_key(self):
+        # jobs with an eta first, then by eta, priority, date_created, seq
+        eta = self.eta
+        return (not eta, eta or 0, self.priority, self.date_created, self.seq)
 
     def sorting_key(self):
         return self.eta, self.priority, self.date_created, self.seq
@@ -218,11 +255,14 @@ class ChannelJob(object):
         return self.priority, self.date_created, self.seq
 
     def __lt__(self, other):
-        if self.eta and not other.eta:
-            return True
-        elif not self.eta and other.eta:
-            return False
-        return self.sorting_key() < other.sorting_key()
+        if self.eta or other.eta:
+            return self.sort_key() < other.sort_key()
+        # jobs without eta, the ones compared in the heap of the channels
+        if self.priority != other.priority:
+            return self.priority < other.priority
+        if self.date_created != other.date_created:
+            return self.date_created < other.date_created
+        return self.seq < other.seq
 
 
 class ChannelQueue(object):
@@ -309,8 +349,10 @@ class ChannelQueue(object):
     """
 
     def __init__(self, sequential=False):
+        # the eta of a job is reset when it is moved to the queue of the jobs
+        # without eta, the heap of the jobs with an eta keeps their key
         self._queue = PriorityQueue()
-        self._eta_queue = PriorityQueue()
+        self._eta_queue = PriorityQueue(key=ChannelJob.sorting_key)
         self.sequential = sequential
 
     def __len__(self):
@@ -411,6 +453,15 @@ class Channel(object):
         self._running = SafeSet()
         self._failed = SafeSet()
         self._pause_until = 0  # utc seconds since the epoch
+        # True when something changed in this channel or in one of its
+        # children since the last time get_jobs_to_run went through it
+        self._dirty = False
+        # cached result of get_wakeup_time for this channel and its
+        # children, None when it must be computed again
+        self._wakeup_time = None
+        # cached result of _get_event_time, None when it must be computed
+        # again
+        self._event_time = None
         self.capacity = capacity
         self.throttle = throttle  # seconds
         self.sequential = sequential
@@ -438,6 +489,7 @@ class Channel(object):
         self.throttle = int(config.get("throttle", 0))
         if self.sequential and self.capacity != 1:
             raise ValueError("A sequential channel must have a capacity of 1")
+        self._invalidate()
 
     @property
     def fullname(self):
@@ -460,8 +512,22 @@ class Channel(object):
             len(self._failed),
         )
 
+    def _invalidate(self):
+        """Mark the channel and its parents as needing a new evaluation.
+
+        Channels that are not invalidated are skipped by get_jobs_to_run
+        until their next event time is reached.
+        """
+        channel = self
+        while channel is not None:
+            channel._dirty = True
+            channel._wakeup_time = None
+            channel._event_time = None
+            channel = channel.parent
+
     def remove(self, job):
         """Remove a job from the channel."""
+        self._invalidate()
         self._queue.remove(job)
         self._running.remove(job)
         self._failed.remove(job)
@@ -483,6 +549,7 @@ class Channel(object):
         from parent channels queues.
         """
         if job not in self._queue:
+            self._invalidate()
             self._queue.add(job)
             self._running.remove(job)
             self._failed.remove(job)
@@ -496,6 +563,7 @@ class Channel(object):
         This also marks the job as running in parent channels.
         """
         if job not in self._running:
+            self._invalidate()
             self._queue.remove(job)
             self._running.add(job)
             self._failed.remove(job)
@@ -506,6 +574,7 @@ class Channel(object):
     def set_failed(self, job):
         """Mark the job as failed."""
         if job not in self._failed:
+            self._invalidate()
             self._queue.remove(job)
             self._running.remove(job)
             self._failed.add(job)
@@ -533,13 +602,54 @@ class Channel(object):
         no job until at least throttle seconds have elapsed since the previous
         yield.
 
+        Children channels in which nothing changed since they were last
+        evaluated and whose next event time is not reached are skipped, as
+        they have no job to give.
+
         :param now: the current datetime in seconds
 
         :return: iterator of
                  :class:`odoo.addons.queue_job.jobrunner.ChannelJob`
         """
+        yield from self._get_jobs_to_run(now)
+        # only mark the channel clean once all its jobs have been taken
+        self._dirty = False
+        self._wakeup_time = None
+        self._event_time = None
+
+    def _needs_run(self, now):
+        if self._dirty:
+            return True
+        event_time = self._get_event_time()
+        return bool(event_time) and event_time <= now
+
+    def _get_event_time(self, event_time=0):
+        """Earliest time at which the evaluation of the channel can change
+
+        Contrary to the wakeup time, it includes the eta of the jobs and the
+        end of the throttle pauses of full or paused channels and of their
+        children: when such a time is reached, the eta jobs become ready and
+        the pauses are reset even if no job can be run.
+        """
+        if self._event_time is None:
+            self._event_time = self._compute_event_time()
+        if not self._event_time:
+            return event_time
+        if not event_time:
+            return self._event_time
+        return min(event_time, self._event_time)
+
+    def _compute_event_time(self):
+        event_time = self._queue.get_wakeup_time(self._pause_until)
+        for child in self.children.values():
+            event_time = child._get_event_time(event_time)
+        return event_time
+
+    def _get_jobs_to_run(self, now):
         # enqueue jobs of children channels
         for child in self.children.values():
+            if not child._needs_run(now):
+                continue
             for job in child.get_jobs_to_run(now):
                 self._queue.add(job)
         # is this channel paused?
@@ -572,6 +682,15 @@ class Channel(object):
                 return
 
     def get_wakeup_time(self, wakeup_time=0):
+        if self._wakeup_time is None:
+            self._wakeup_time = self._compute_wakeup_time()
+        if not self._wakeup_time:
+            return wakeup_time
+        if not wakeup_time:
+            return self._wakeup_time
+        return min(wakeup_time, self._wakeup_time)
+
+    def _compute_wakeup_time(self, wakeup_time=0):
         if not self.has_capacity():
             # this channel is full, do not request timed wakeup, as
             # a notification will wakeup the runner when a job finishes
@@ -796,6 +915,31 @@ class ChannelManager(object):
     >>> cm.notify(db, 'S', 'S3', 3, 0, 10, None, 'done')
     >>> pp(list(cm.get_jobs_to_run(now=105)))
     []
+
+    Channels in which nothing happened are not evaluated again until
+    their wakeup time.
+
+    >>> cm = ChannelManager()
+    >>> cm.simple_configure('root:4,A:1,B:1')
+    >>> cm.notify(db, 'A', 'A1', 1, 0, 10, None, 'pending')
+    >>> cm.notify(db, 'B', 'B1', 1, 0, 10, None, 'pending')
+    >>> cm.notify(db, 'B', 'B2', 2, 0, 10, 110, 'pending')
+    >>> pp(list(cm.get_jobs_to_run(now=100)))
+    [<ChannelJob A1>, <ChannelJob B1>]
+    >>> a, b = cm.get_channel_by_name('A'), cm.get_channel_by_name('B')
+    >>> a._needs_run(now=101), b._needs_run(now=101)
+    (False, False)
+    >>> cm.notify(db, 'B', 'B1', 1, 0, 10, None, 'done')
+    >>> a._needs_run(now=101), b._needs_run(now=101)
+    (False, True)
+    >>> pp(list(cm.get_jobs_to_run(now=101)))
+    []
+    >>> cm.get_wakeup_time()
+    110
+    >>> b._needs_run(now=109), b._needs_run(now=110)
+    (False, True)
+    >>> pp(list(cm.get_jobs_to_run(now=110)))
+    [<ChannelJob B2>]
     """
 
     def __init__(self):
@@ -1066,12 +1210,58 @@ class ChannelManager(object):
             job.channel.remove(job)
             del self._jobs_by_uuid[job.uuid]
 
-    def remove_db(self, db_name):
+    def remove_db(self, db_name, keep_failed=False):
+        """Remove the jobs of a database
+
+        With ``keep_failed``, the failed jobs are kept, so they still block
+        their sequential channels.
+
+        >>> cm = ChannelManager()
+        >>> cm.simple_configure('root:1,root.S:1:sequential')
+        >>> cm.notify('db', 'S', 'S1', 1, 0, 10, None, 'failed')
+        >>> cm.notify('db', 'root', 'A1', 2, 0, 10, None, 'pending')
+        >>> cm.remove_db('db', keep_failed=True)
+        >>> cm.get_db_uuids('db')
+        {'S1'}
+        >>> cm.remove_db('db')
+        >>> cm.get_db_uuids('db')
+        set()
+        """
         for job in list(self._jobs_by_uuid.values()):
             if job.db_name == db_name:
+                if keep_failed and job in job.channel._failed:
+                    continue
                 job.channel.remove(job)
                 del self._jobs_by_uuid[job.uuid]
 
+    def get_db_uuids(self, db_name):
+        return {
+            job.uuid
+            for job in list(self._jobs_by_uuid.values())
+            if job.db_name == db_name
+        }
+
+    def has_db_jobs(self, db_name):
+        """Return whether jobs of the database are queued or running
+
+        The failed jobs are not considered, they wait for a manual action.
+
+        >>> cm = ChannelManager()
+        >>> cm.simple_configure('root:1')
+        >>> cm.has_db_jobs('db')
+        False
+        >>> cm.notify('db', 'root', 'A1', 1, 0, 10, None, 'pending')
+        >>> cm.has_db_jobs('db'), cm.has_db_jobs('other')
+        (True, False)
+        >>> cm.notify('db', 'root', 'A1', 1, 0, 10, None, 'failed')
+        >>> cm.has_db_jobs('db')
+        False
+        """
+        return any(
+            job.db_name == db_name and job not in job.channel._failed
+            for job in list(self._jobs_by_uuid.values())
+        )
+
     def get_jobs_to_run(self, now):
         return self._root_channel.get_jobs_to_run(now)
 
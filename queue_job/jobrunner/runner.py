@@ -12,7 +12,8 @@ How does it work?
 
 * It starts as a thread in the Odoo main process or as a new worker
 * It receives postgres NOTIFY messages each time jobs are
-  added or updated in the queue_job table.
+  added or updated in the queue_job table. The messages carry the
+  properties of the job needed to schedule it.
 * It maintains an in-memory priority queue of jobs that
   is populated from the queue_job tables in all databases.
 * It does not run jobs itself, but asks Odoo to run them through an
@@ -31,6 +32,23 @@ How to use it?
   - ``ODOO_QUEUE_JOB_PORT=443``, default ``http_port`` or 8069 if unset.
   - ``ODOO_QUEUE_JOB_HTTP_AUTH_USER=jobrunner``, default empty.
   - ``ODOO_QUEUE_JOB_HTTP_AUTH_PASSWORD=s3cr3t``, default empty.
+  - ``ODOO_QUEUE_JOB_HTTP_CONCURRENCY=64``, maximum number of concurrent
+    requests sent to ``/queue_job/runjob``, default the capacity of the root
+    channel (32 when it is unlimited). A lower value makes the jobs
+    counted as running by the channels wait for a free connection.
+  - ``ODOO_QUEUE_JOB_DISPATCHER=process``, how the jobs are run, default
+    ``http`` (see below).
+  - ``ODOO_QUEUE_JOB_WORKER_PROCESSES=8``, number of worker processes
+    when the dispatcher is ``process``, default the capacity of the root
+    channel.
+  - ``ODOO_QUEUE_JOB_DB_DISCOVERY_INTERVAL=300``, interval in seconds at
+    which the databases are listed again, to handle the databases created
+    or dropped, and the ones where queue_job is installed, without
+    restarting Odoo, default 60, 0 to disable.
+  - ``ODOO_QUEUE_JOB_DB_IDLE_TIMEOUT=3600``, delay in seconds after which
+    the connection of a database without any job to run and without
+    activity is closed (see below), default 0 (never). It is ignored when
+    the discovery is disabled.
   - ``ODOO_QUEUE_JOB_JOBRUNNER_DB_HOST=master-db``, default ``db_host``
     or ``False`` if unset.
   - ``ODOO_QUEUE_JOB_JOBRUNNER_DB_PORT=5432``, default ``db_port``
@@ -52,6 +70,11 @@ How to use it?
   port = 443
   http_auth_user = jobrunner
   http_auth_password = s3cr3t
+  http_concurrency = 64
+  dispatcher = http
+  worker_processes = 8
+  db_discovery_interval = 300
+  db_idle_timeout = 3600
   jobrunner_db_host = master-db
   jobrunner_db_port = 5432
   jobrunner_db_user = userdb
@@ -70,6 +93,11 @@ How to use it?
   queue_job.port = 443
   queue_job.http_auth_user = jobrunner
   queue_job.http_auth_password = s3cr3t
+  queue_job.http_concurrency = 64
+  queue_job.dispatcher = http
+  queue_job.worker_processes = 8
+  queue_job.db_discovery_interval = 300
+  queue_job.db_idle_timeout = 3600
 
 * Start Odoo with ``--load=web,web_kanban,queue_job``
   and ``--workers`` greater than 1 [2]_, or set the ``server_wide_modules``
@@ -99,8 +127,15 @@ How to use it?
 
   ...INFO...queue_job.jobrunner.runner: starting
   ...INFO...queue_job.jobrunner.runner: initializing database connections
-  ...INFO...queue_job.jobrunner.runner: queue job runner ready for db <dbname>
+  ...INFO...queue_job.jobrunner.runner: queue job runner loading <n> jobs for db <dbname>
   ...INFO...queue_job.jobrunner.runner: database connections ready
+  ...INFO...queue_job.jobrunner.runner: queue job runner ready for db <dbname> (<n> jobs loaded)
+
+  The running jobs are loaded first, then the failed and pending jobs are
+  loaded in chunks and dispatched while the load is still in progress; on
+  large queues the progress of the load is logged regularly.
+  Jobs waiting for their dependencies are not loaded, they are picked up
+  once they become pending.
 
 * Create jobs (eg using base_import_async) and observe they
   start immediately and in parallel.
@@ -108,11 +143,50 @@ How to use it?
 * Tip: to enable debug logging for the queue job, use
   ``--log-handler=odoo.addons.queue_job:DEBUG``
 
+Running jobs in worker processes
+--------------------------------
+
+By default, the runner asks Odoo to run each job through a
+``/queue_job/runjob`` HTTP request. For short jobs, the cost of the HTTP
+request and of the environment setup around it can exceed the cost of the
+job itself. With ``dispatcher = process`` (or
+``ODOO_QUEUE_JOB_DISPATCHER=process``), the runner starts instead a pool of
+long-lived Odoo processes, and sends them the jobs to run through pipes.
+The jobs are run with the same code as the HTTP route, so retries and
+failures are handled the same way, and the HTTP server is not involved.
+
+* The number of processes is ``worker_processes``, or the capacity of the
+  root channel when it is not set. Each process runs one job at a time.
+* The processes use the configuration of the server running the runner
+  (database connection, addons path, logging).
+* A process is replaced after ``limit_request`` jobs, when it exceeds
+  ``limit_memory_soft``, or when it dies. Unlike the HTTP workers of Odoo,
+  the processes do not enforce ``limit_time_cpu`` and ``limit_time_real``.
+* When several addons inherit from ``RunJobController``, the processes
+  combine all the subclasses they know of, whatever the database.
+
+Many databases
+--------------
+
+The runner keeps a connection listening for notifications on each
+database where queue_job is installed. The list of databases is read again
+every ``db_discovery_interval`` seconds: the new databases, and the ones
+where queue_job has been installed, are handled without restarting Odoo,
+and the dropped databases are released.
+
+With ``db_idle_timeout``, the connection of a database is closed (the
+database is *parked*) when the database has no job queued or running and
+no job changed for this delay. The parked databases are checked for jobs
+to run at each discovery, so a job created in a parked database starts
+with a delay of up to ``db_discovery_interval`` seconds; a database is
+listened to again as soon as it has jobs to run.
+
 Caveat
 ------
 
-* After creating a new database or installing queue_job on an
-  existing database, Odoo must be restarted for the runner to detect it.
+* When the discovery is disabled, after creating a new database or
+  installing queue_job on an existing database, Odoo must be restarted
+  for the runner to detect it.
 
 * When Odoo shuts down normally, it waits for running jobs to finish.
   However, when the Odoo server crashes or is otherwise force-stopped,
@@ -139,10 +213,16 @@ Caveat
        of running Odoo is obviously not for production purposes.
 """
 
+import collections
 import datetime
+import json
 import logging
 import os
+import pickle
+import queue
 import selectors
+import subprocess
+import sys
 import threading
 import time
 from contextlib import closing, contextmanager
@@ -155,10 +235,60 @@ import odoo
 from odoo.tools import config
 
 from . import queue_job_config
-from .channels import ENQUEUED, NOT_DONE, PENDING, ChannelManager
+from .channels import (
+    ENQUEUED,
+    FAILED,
+    NOT_DONE,
+    PENDING,
+    STARTED,
+    WAIT_DEPENDENCIES,
+    ChannelManager,
+)
 
 SELECT_TIMEOUT = 60
 ERROR_RECOVERY_DELAY = 5
+# maximum number of job uuids read back in a single query when processing
+# notifications
+NOTIFICATIONS_CHUNK_SIZE = 1000
+# maximum number of concurrent /queue_job/runjob requests when the capacity
+# of the root channel is unlimited
+DEFAULT_HTTP_CONCURRENCY = 32
+# interval in seconds between two listings of the databases
+DEFAULT_DB_DISCOVERY_INTERVAL = 60
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "worker.py")
+# seconds given to a worker process to exit once its input is closed
+WORKER_STOP_TIMEOUT = 10
+# interval in seconds at which the count of jobs reset to pending is logged
+RESET_STATS_INTERVAL = 60
+
+# jobs loaded at startup are read in chunks of this size, one chunk per
+# database and per iteration of the main loop, so dispatching starts before
+# the whole table has been read
+INITIAL_LOAD_CHUNK_SIZE = 10000
+# interval in seconds between two logs of the initial load progress
+INITIAL_LOAD_LOG_INTERVAL = 10
+# jobs waiting for dependencies are never runnable, they are loaded when
+# a notification tells us they have been promoted to pending
+INITIAL_LOAD_STATES = tuple(state for state in NOT_DONE if state != WAIT_DEPENDENCIES)
+# the initial load reads the jobs by state, (states, chunk size) in this
+# order: the running jobs take the capacity of the channels and the failed
+# jobs block the sequential channels, so they are all known before the
+# first pending job is dispatched; there are few running jobs, they are
+# read at once
+INITIAL_LOAD_PHASES = (
+    ((ENQUEUED, STARTED), None),
+    ((FAILED,), INITIAL_LOAD_CHUNK_SIZE),
+    ((PENDING,), INITIAL_LOAD_CHUNK_SIZE),
+)
+# a parked database is listened to again when it has jobs in these states
+UNPARK_STATES = (PENDING, ENQUEUED, STARTED)
+# (trigger name, event) of the triggers created by ``create_notify_triggers``
+NOTIFY_TRIGGERS = {
+    ("queue_job_notify", "UPDATE"),
+    ("queue_job_notify_insert", "INSERT"),
+    ("queue_job_notify_delete", "DELETE"),
+}
 
 _logger = logging.getLogger(__name__)
 
@@ -192,6 +322,42 @@ def _odoo_now():
     return _datetime_to_epoch(dt)
 
 
+def _parse_notification(payload):
+    """Return the uuid and the properties of the job of a notification
+
+    The payload of the queue_job_notify triggers is a json array of the
+    columns read by ``select_jobs``, followed by a number making every
+    notification unique (see ``create_notify_triggers``). When the job is
+    deleted or its properties do not fit in a notification, the array only
+    holds the uuid and the number: the properties returned are None and the
+    job must be read from the database, as for a payload made of the uuid
+    alone. The uuid is None when the payload is malformed.
+
+    >>> _parse_notification(
+    ...     '["root", "7a5f", 12, 1700000000.5, 10, null, "pending", 3]'
+    ... )
+    ('7a5f', ('root', '7a5f', 12, 1700000000.5, 10, None, 'pending'))
+    >>> _parse_notification('["7a5f", 4]')
+    ('7a5f', None)
+    >>> _parse_notification('7a5f')
+    ('7a5f', None)
+    >>> _parse_notification('["root", "7a5f"')
+    (None, None)
+    """
+    if not payload.startswith("["):
+        return payload, None
+    try:
+        values = json.loads(payload)
+    except ValueError:
+        values = None
+    if isinstance(values, list) and len(values) == 8:
+        return values[1], tuple(values[:7])
+    if isinstance(values, list) and len(values) == 2:
+        return values[0], None
+    _logger.warning("malformed notification payload: %r", payload)
+    return None, None
+
+
 def _connection_info_for(db_name):
     db_or_uri, connection_info = odoo.sql_db.connection_info_for(db_name)
 
@@ -206,57 +372,222 @@ def _connection_info_for(db_name):
     return connection_info
 
 
-def _async_http_get(scheme, host, port, user, password, db_name, job_uuid):
-    # Method to set failed job (due to timeout, etc) as pending,
-    # to avoid keeping it as enqueued.
-    def set_job_pending():
-        connection_info = _connection_info_for(db_name)
-        conn = psycopg2.connect(**connection_info)
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        with closing(conn.cursor()) as cr:
-            cr.execute(
-                "UPDATE queue_job SET state=%s, "
-                "date_enqueued=NULL, date_started=NULL "
-                "WHERE uuid=%s and state=%s "
-                "RETURNING uuid",
-                (PENDING, job_uuid, ENQUEUED),
-            )
-            if cr.fetchone():
-                _logger.warning(
-                    "state of job %s was reset from %s to %s",
-                    job_uuid,
-                    ENQUEUED,
-                    PENDING,
-                )
+class HttpDispatcher(object):
+    """Ask Odoo to run jobs through ``/queue_job/runjob`` HTTP requests
+
+    The requests are sent by a bounded pool of long-lived threads. Each
+    thread keeps its own HTTP session, so connections are kept alive and
+    reused between jobs instead of opening a new one for every job.
 
-    # TODO: better way to HTTP GET asynchronously (grequest, ...)?
-    #       if this was python3 I would be doing this with
-    #       asyncio, aiohttp and aiopg
-    def urlopen():
+    When a request fails or times out, ``on_failure`` is called with the
+    database name and the job uuid, so the job can be set back to pending
+    instead of being kept as enqueued.
+    """
+
+    def __init__(
+        self,
+        scheme="http",
+        host="localhost",
+        port=8069,
+        user=None,
+        password=None,
+        concurrency=DEFAULT_HTTP_CONCURRENCY,
+        on_failure=None,
+    ):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.concurrency = max(int(concurrency), 1)
+        self.on_failure = on_failure
+        self._queue = queue.Queue()
+        self._threads = []
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            if self.user:
+                session.auth = (self.user, self.password)
+            self._local.session = session
+        return session
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._urlopen(*item)
+
+    def _urlopen(self, db_name, job_uuid):
         url = "{}://{}:{}/queue_job/runjob?db={}&job_uuid={}".format(
-            scheme, host, port, db_name, job_uuid
+            self.scheme, self.host, self.port, db_name, job_uuid
         )
         try:
-            auth = None
-            if user:
-                auth = (user, password)
             # we are not interested in the result, so we set a short timeout
             # but not too short so we trap and log hard configuration errors
-            response = requests.get(url, timeout=1, auth=auth)
+            response = self._session().get(url, timeout=1)
 
             # raise_for_status will result in either nothing, a Client Error
             # for HTTP Response codes between 400 and 500 or a Server Error
             # for codes between 500 and 600
             response.raise_for_status()
         except requests.Timeout:
-            set_job_pending()
+            self._failed(db_name, job_uuid)
         except Exception:
             _logger.exception("exception in GET %s", url)
-            set_job_pending()
+            self._failed(db_name, job_uuid)
+
+    def _failed(self, db_name, job_uuid):
+        if self.on_failure:
+            self.on_failure(db_name, job_uuid)
+
+    def dispatch(self, db_name, job_uuid):
+        """Ask Odoo to run a job, without waiting for the answer"""
+        self._queue.put((db_name, job_uuid))
+        if len(self._threads) < self.concurrency:
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self):
+        """Stop the threads once the jobs already dispatched are sent"""
+        for __ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+
+
+class _WorkerProcess(object):
+    """An Odoo process running the jobs it receives through a pipe
+
+    See ``worker.py`` for the protocol.
+    """
+
+    def __init__(self):
+        child_read, parent_write = os.pipe()
+        parent_read, child_write = os.pipe()
+        env = dict(os.environ)
+        # odoo may not be installed, but run from a source directory
+        env["PYTHONPATH"] = os.pathsep.join(path for path in sys.path if path)
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, WORKER_SCRIPT, str(child_read), str(child_write)],
+                pass_fds=(child_read, child_write),
+                env=env,
+                # do not receive the SIGINT sent to the server by a terminal,
+                # the worker stops when the runner closes its input
+                start_new_session=True,
+            )
+        finally:
+            os.close(child_read)
+            os.close(child_write)
+        self._writer = os.fdopen(parent_write, "wb")
+        self._reader = os.fdopen(parent_read, "rb")
+        self.job_count = 0
+        self.recycle = False
+        self._send(dict(config.options))
+
+    def _send(self, message):
+        pickle.dump(message, self._writer)
+        self._writer.flush()
+
+    def run(self, db_name, job_uuid):
+        """Run a job and wait until it is done, return False if it failed"""
+        self.job_count += 1
+        self._send((db_name, job_uuid))
+        success, self.recycle = pickle.load(self._reader)
+        return success
+
+    def stop(self):
+        # pylint: disable=except-pass
+        for pipe in (self._writer, self._reader):
+            try:
+                pipe.close()
+            except Exception:
+                pass
+        try:
+            self.process.wait(timeout=WORKER_STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            _logger.warning(
+                "queue job worker (%s) did not stop, killing it", self.process.pid
+            )
+            self.process.kill()
+
 
-    thread = threading.Thread(target=urlopen)
-    thread.daemon = True
-    thread.start()
+class ProcessDispatcher(object):
+    """Run jobs in a pool of long-lived Odoo worker processes
+
+    Each thread of the pool owns a worker process, started with the
+    configuration of the current server. The thread sends the database
+    name and the uuid of the job to its worker through a pipe, and waits
+    until the job is done before sending the next one. The worker runs the
+    job with the same code as the ``/queue_job/runjob`` route, without the
+    HTTP request and the registry setup around it.
+
+    Workers are replaced after ``max_jobs`` jobs (when set), when they
+    exceed the soft memory limit of Odoo, or when they die.
+
+    When a job cannot be run, ``on_failure`` is called with the database
+    name and the job uuid, so the job can be set back to pending if it is
+    still enqueued.
+    """
+
+    def __init__(self, concurrency=1, max_jobs=0, on_failure=None):
+        self.concurrency = max(int(concurrency), 1)
+        self.max_jobs = max_jobs
+        self.on_failure = on_failure
+        self._queue = queue.Queue()
+        self._threads = []
+
+    def _work(self):
+        worker = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                try:
+                    if worker is None:
+                        worker = _WorkerProcess()
+                    success = worker.run(*item)
+                except Exception:
+                    _logger.exception("could not run job %s in a worker", item[1])
+                    success = False
+                    if worker is not None:
+                        worker.recycle = True
+                if not success:
+                    self._failed(*item)
+                if worker is not None and (
+                    worker.recycle
+                    or (self.max_jobs and worker.job_count >= self.max_jobs)
+                ):
+                    worker.stop()
+                    worker = None
+        finally:
+            if worker is not None:
+                worker.stop()
+
+    def _failed(self, db_name, job_uuid):
+        if self.on_failure:
+            self.on_failure(db_name, job_uuid)
+
+    def dispatch(self, db_name, job_uuid):
+        """Send a job to a worker process, without waiting for the result"""
+        self._queue.put((db_name, job_uuid))
+        if len(self._threads) < self.concurrency:
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self):
+        """Stop the workers once the jobs already dispatched are done"""
+        for __ in self._threads:
+            self._queue.put(None)
+        self._threads = []
 
 
 class Database(object):
@@ -266,6 +597,17 @@ class Database(object):
         self.conn = psycopg2.connect(**connection_info)
         self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
         self.has_queue_job = self._has_queue_job()
+        # progress of the initial load of the jobs, see start_initial_load
+        self.loading = False
+        self.load_phase = 0
+        self.load_last_seq = 0
+        self.load_count = 0
+        self.load_total = 0
+        # failed jobs kept while the database was parked, dropped at the end
+        # of the load of the failed jobs unless they are loaded again
+        self.kept_uuids = set()
+        # time of the last notification or dispatch, see ``db_idle_timeout``
+        self.last_activity = time.time()
         if self.has_queue_job:
             self._initialize()
 
@@ -296,15 +638,15 @@ class Database(object):
                 _logger.debug("queue_job is not installed for db %s", self.db_name)
                 return False
             cr.execute(
-                """SELECT COUNT(1)
+                """SELECT trigger_name, event_manipulation
                 FROM information_schema.triggers
                 WHERE event_object_table = %s
-                AND trigger_name = %s""",
-                ("queue_job", "queue_job_notify"),
+                AND trigger_name IN %s""",
+                ("queue_job", tuple({name for name, __ in NOTIFY_TRIGGERS})),
             )
-            if cr.fetchone()[0] != 3:  # INSERT, DELETE, UPDATE
+            if set(cr.fetchall()) != NOTIFY_TRIGGERS:
                 _logger.error(
-                    "queue_job_notify trigger is missing in db %s", self.db_name
+                    "queue_job_notify triggers are missing in db %s", self.db_name
                 )
                 return False
             return True
@@ -313,15 +655,55 @@ class Database(object):
         with closing(self.conn.cursor()) as cr:
             cr.execute("LISTEN queue_job")
 
+    @staticmethod
+    def has_jobs_to_run(db_name):
+        """Return whether a database which is not listened to has jobs to run
+
+        The check is done with a short-lived connection. True is returned
+        when it fails, the database is then checked as a new one.
+        """
+        try:
+            conn = psycopg2.connect(**_connection_info_for(db_name))
+        except psycopg2.Error:
+            _logger.debug("cannot connect to db %s", db_name, exc_info=True)
+            return True
+        try:
+            with closing(conn.cursor()) as cr:
+                cr.execute(
+                    "SELECT 1 FROM queue_job WHERE state in %s LIMIT 1",
+                    (UNPARK_STATES,),
+                )
+                return bool(cr.fetchone())
+        except psycopg2.Error:
+            _logger.debug("cannot read the jobs of db %s", db_name, exc_info=True)
+            return True
+        finally:
+            conn.close()
+
+    def start_initial_load(self):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "SELECT count(*) FROM queue_job WHERE state in %s",
+                (INITIAL_LOAD_STATES,),
+            )
+            self.load_total = cr.fetchone()[0]
+        self.loading = True
+        self.load_phase = 0
+        self.load_last_seq = 0
+        self.load_count = 0
+
     @contextmanager
     def select_jobs(self, where, args):
         # pylint: disable=sql-injection
         # the checker thinks we are injecting values but we are not, we are
         # adding the where conditions, values are added later properly with
         # parameters
+        # the dates are read as the notifications send them, see
+        # ``create_notify_triggers``
         query = (
-            "SELECT channel, uuid, id as seq, date_created, "
-            "priority, EXTRACT(EPOCH FROM eta), state "
+            "SELECT channel, uuid, id as seq, "
+            "EXTRACT(EPOCH FROM date_created)::float8, "
+            "priority, EXTRACT(EPOCH FROM eta)::float8, state "
             "FROM queue_job WHERE %s" % (where,)
         )
         with closing(self.conn.cursor("select_jobs", withhold=True)) as cr:
@@ -333,15 +715,35 @@ class Database(object):
         with closing(self.conn.cursor()) as cr:
             cr.execute(query)
 
-    def set_job_enqueued(self, uuid):
+    def set_jobs_enqueued(self, uuids):
+        """Set pending jobs as enqueued, return the uuids of enqueued jobs
+
+        A job may have changed of state since the runner was notified, for
+        instance when it was executed with another job of the same function
+        (see ``coalesce_limit`` on the job functions).
+        """
         with closing(self.conn.cursor()) as cr:
             cr.execute(
                 "UPDATE queue_job SET state=%s, "
                 "date_enqueued=date_trunc('seconds', "
                 "                         now() at time zone 'utc') "
-                "WHERE uuid=%s",
-                (ENQUEUED, uuid),
+                "WHERE uuid = ANY(%s) AND state=%s "
+                "RETURNING uuid",
+                (ENQUEUED, list(uuids), PENDING),
             )
+            return {row[0] for row in cr.fetchall()}
+
+    def set_jobs_pending(self, uuids):
+        """Set enqueued jobs back to pending, return the uuids of reset jobs"""
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "UPDATE queue_job SET state=%s, "
+                "date_enqueued=NULL, date_started=NULL "
+                "WHERE uuid = ANY(%s) AND state=%s "
+                "RETURNING uuid",
+                (PENDING, list(uuids), ENQUEUED),
+            )
+            return [row[0] for row in cr.fetchall()]
 
 
 class QueueJobRunner(object):
@@ -353,6 +755,11 @@ class QueueJobRunner(object):
         user=None,
         password=None,
         channel_config_string=None,
+        http_concurrency=None,
+        dispatcher="http",
+        worker_processes=None,
+        db_discovery_interval=DEFAULT_DB_DISCOVERY_INTERVAL,
+        db_idle_timeout=0,
     ):
         self.scheme = scheme
         self.host = host
@@ -363,9 +770,67 @@ class QueueJobRunner(object):
         if channel_config_string is None:
             channel_config_string = _channels()
         self.channel_manager.simple_configure(channel_config_string)
+        root = self.channel_manager.get_channel_by_name("root")
+        if dispatcher == "process":
+            if not worker_processes:
+                # as many workers as jobs that can run at the same time
+                worker_processes = root.capacity or 1
+            self.dispatcher = ProcessDispatcher(
+                concurrency=worker_processes,
+                max_jobs=config["limit_request"],
+                on_failure=self._reset_job_later,
+            )
+        elif dispatcher == "http":
+            if not http_concurrency:
+                # as many requests as jobs that can run at the same time
+                http_concurrency = root.capacity or DEFAULT_HTTP_CONCURRENCY
+            elif root.capacity and http_concurrency < root.capacity:
+                _logger.warning(
+                    "http_concurrency (%d) is lower than the capacity of the "
+                    "root channel (%d), jobs will wait for a free connection",
+                    http_concurrency,
+                    root.capacity,
+                )
+            self.dispatcher = HttpDispatcher(
+                scheme=scheme,
+                host=host,
+                port=port,
+                user=user,
+                password=password,
+                concurrency=http_concurrency,
+                on_failure=self._reset_job_later,
+            )
+        else:
+            raise ValueError("Unknown queue job dispatcher: %s" % dispatcher)
         self.db_by_name = {}
+        self.db_discovery_interval = db_discovery_interval
+        if db_idle_timeout and not db_discovery_interval:
+            # the parked databases are attached again by the discovery
+            _logger.warning(
+                "db_idle_timeout is ignored when db_discovery_interval is 0"
+            )
+            db_idle_timeout = 0
+        self.db_idle_timeout = db_idle_timeout
+        # databases with queue_job whose connection has been closed because
+        # they were idle, see ``discover_databases``
+        self.parked_db_names = set()
+        # databases without queue_job, not checked again by the discovery
+        self.ignored_db_names = set()
+        self._discovered_at = 0
         self._stop = False
         self._stop_pipe = os.pipe()
+        # jobs that could not be dispatched, to set back to pending; they
+        # are reset in batch by the main loop, on its own connections,
+        # rather than by opening a new connection per job in the
+        # dispatcher threads
+        self._jobs_to_reset = collections.deque()
+        self._reset_count = 0
+        self._reset_count_since = time.time()
+        # db_name -> time of the last initial load progress log
+        self._load_logged_at = {}
+        self._wakeup_pipe = os.pipe()
+        for fd in self._wakeup_pipe:
+            os.set_blocking(fd, False)
 
     @classmethod
     def from_environ_or_config(cls):
@@ -388,12 +853,36 @@ class QueueJobRunner(object):
         password = os.environ.get(
             "ODOO_QUEUE_JOB_HTTP_AUTH_PASSWORD"
         ) or queue_job_config.get("http_auth_password")
+        http_concurrency = os.environ.get(
+            "ODOO_QUEUE_JOB_HTTP_CONCURRENCY"
+        ) or queue_job_config.get("http_concurrency")
+        dispatcher = os.environ.get(
+            "ODOO_QUEUE_JOB_DISPATCHER"
+        ) or queue_job_config.get("dispatcher")
+        worker_processes = os.environ.get(
+            "ODOO_QUEUE_JOB_WORKER_PROCESSES"
+        ) or queue_job_config.get("worker_processes")
+        db_discovery_interval = os.environ.get(
+            "ODOO_QUEUE_JOB_DB_DISCOVERY_INTERVAL"
+        ) or queue_job_config.get("db_discovery_interval")
+        db_idle_timeout = os.environ.get(
+            "ODOO_QUEUE_JOB_DB_IDLE_TIMEOUT"
+        ) or queue_job_config.get("db_idle_timeout")
         runner = cls(
             scheme=scheme or "http",
             host=host or "localhost",
             port=port or 8069,
             user=user,
             password=password,
+            http_concurrency=int(http_concurrency or 0),
+            dispatcher=dispatcher or "http",
+            worker_processes=int(worker_processes or 0),
+            db_discovery_interval=int(
+                DEFAULT_DB_DISCOVERY_INTERVAL
+                if db_discovery_interval is None
+                else db_discovery_interval
+            ),
+            db_idle_timeout=int(db_idle_timeout or 0),
         )
         return runner
 
@@ -412,34 +901,240 @@ class QueueJobRunner(object):
                 db.close()
             except Exception:
                 _logger.warning("error closing database %s", db_name, exc_info=True)
+        if remove_jobs:
+            for db_name in self.parked_db_names:
+                self.channel_manager.remove_db(db_name)
         self.db_by_name = {}
+        self.parked_db_names = set()
+        self.ignored_db_names = set()
 
     def initialize_databases(self):
         for db_name in self.get_db_names():
-            db = Database(db_name)
-            if db.has_queue_job:
-                self.db_by_name[db_name] = db
-                with db.select_jobs("state in %s", (NOT_DONE,)) as cr:
-                    for job_data in cr:
-                        self.channel_manager.notify(db_name, *job_data)
-                _logger.info("queue job runner ready for db %s", db_name)
+            self._attach_database(db_name)
+        self._discovered_at = time.time()
+
+    def _attach_database(self, db_name):
+        db = Database(db_name)
+        if not db.has_queue_job:
+            db.close()
+            self.ignored_db_names.add(db_name)
+            return
+        self.ignored_db_names.discard(db_name)
+        self.db_by_name[db_name] = db
+        db.kept_uuids = self.channel_manager.get_db_uuids(db_name)
+        db.start_initial_load()
+        _logger.info(
+            "queue job runner loading %d jobs for db %s",
+            db.load_total,
+            db_name,
+        )
+        self._load_logged_at[db_name] = time.time()
+
+    def _detach_database(self, db_name, keep_failed=False):
+        self.channel_manager.remove_db(db_name, keep_failed=keep_failed)
+        self._load_logged_at.pop(db_name, None)
+        self.db_by_name.pop(db_name).close()
+
+    @staticmethod
+    def _registry_has_queue_job(db_name):
+        """Return whether queue_job is loaded in the registry of a database
+
+        Only the registries loaded in the process of the runner are known,
+        without connecting to the database.
+        """
+        registry = odoo.modules.registry.Registry.registries.get(db_name)
+        return registry is not None and "queue.job" in registry
+
+    def discover_databases(self):
+        """Follow the databases created, dropped, or idle since the start
+
+        The idle databases are parked: their connection is closed until
+        they have jobs to run. Their failed jobs are kept, so the sequential
+        channels stay blocked. Every ``db_discovery_interval`` seconds, the
+        databases are listed again: the new ones are attached, the dropped
+        ones are detached, and the parked ones having jobs to run are
+        attached again. The databases without queue_job are not checked
+        again, unless queue_job is loaded in their registry.
+        """
+        now = time.time()
+        if self.db_idle_timeout:
+            for db_name, db in list(self.db_by_name.items()):
+                if (
+                    not db.loading
+                    and now - db.last_activity >= self.db_idle_timeout
+                    and not self.channel_manager.has_db_jobs(db_name)
+                ):
+                    _logger.info("queue job runner parking idle db %s", db_name)
+                    self._detach_database(db_name, keep_failed=True)
+                    self.parked_db_names.add(db_name)
+        if (
+            not self.db_discovery_interval
+            or now - self._discovered_at < self.db_discovery_interval
+        ):
+            return
+        self._discovered_at = now
+        db_names = set(self.get_db_names())
+        for db_name in set(self.db_by_name) - db_names:
+            _logger.info("queue job runner detaching dropped db %s", db_name)
+            self._detach_database(db_name)
+        for db_name in self.parked_db_names - db_names:
+            self.channel_manager.remove_db(db_name)
+        self.parked_db_names &= db_names
+        self.ignored_db_names &= db_names
+        for db_name in db_names - set(self.db_by_name):
+            if self._stop:
+                break
+            if db_name in self.ignored_db_names:
+                if not self._registry_has_queue_job(db_name):
+                    continue
+                _logger.info("queue job runner found queue_job in db %s", db_name)
+            if db_name in self.parked_db_names:
+                if not Database.has_jobs_to_run(db_name):
+                    continue
+                _logger.info("queue job runner unparking db %s", db_name)
+                self.parked_db_names.discard(db_name)
+            try:
+                self._attach_database(db_name)
+            except Exception:
+                # it is tried again at the next discovery
+                _logger.warning(
+                    "queue job runner cannot attach db %s", db_name, exc_info=True
+                )
+                if db_name in self.db_by_name:
+                    self._detach_database(db_name)
+
+    def load_jobs(self):
+        """Load the next chunk of jobs of the databases being initialized
+
+        The jobs are loaded by state, see ``INITIAL_LOAD_PHASES``: the
+        running jobs at once, then the failed and the pending jobs in chunks.
+        In each phase, jobs are read by increasing id, so the jobs created or
+        modified meanwhile are either part of a next chunk or are received as
+        notifications; in both cases the channel manager ends up with
+        their latest state.
+        """
+        for db in self.db_by_name.values():
+            if self._stop:
+                break
+            if not db.loading:
+                continue
+            states, chunk_size = INITIAL_LOAD_PHASES[db.load_phase]
+            where = "state in %s AND id > %s ORDER BY id"
+            args = (states, db.load_last_seq)
+            if chunk_size:
+                where += " LIMIT %s"
+                args += (chunk_size,)
+            count = 0
+            with db.select_jobs(where, args) as cr:
+                for job_data in cr:
+                    self.channel_manager.notify(db.db_name, *job_data)
+                    db.kept_uuids.discard(job_data[1])
+                    db.load_last_seq = job_data[2]
+                    count += 1
+            db.load_count += count
+            if not chunk_size or count < chunk_size:
+                if FAILED in states:
+                    # done or cancelled while the database was parked
+                    for uuid in db.kept_uuids:
+                        self.channel_manager.remove_job(uuid)
+                    db.kept_uuids = set()
+                db.load_phase += 1
+                db.load_last_seq = 0
+                if db.load_phase < len(INITIAL_LOAD_PHASES):
+                    continue
+                db.loading = False
+                self._load_logged_at.pop(db.db_name, None)
+                _logger.info(
+                    "queue job runner ready for db %s (%d jobs loaded)",
+                    db.db_name,
+                    db.load_count,
+                )
+                continue
+            now = time.time()
+            if now - self._load_logged_at[db.db_name] >= INITIAL_LOAD_LOG_INTERVAL:
+                self._load_logged_at[db.db_name] = now
+                _logger.info(
+                    "queue job runner loading db %s: %d/%d jobs loaded",
+                    db.db_name,
+                    db.load_count,
+                    db.load_total,
+                )
 
     def run_jobs(self):
         now = _odoo_now()
+        jobs_by_db = {}
         for job in self.channel_manager.get_jobs_to_run(now):
             if self._stop:
                 break
-            _logger.info("asking Odoo to run job %s on db %s", job.uuid, job.db_name)
-            self.db_by_name[job.db_name].set_job_enqueued(job.uuid)
-            _async_http_get(
-                self.scheme,
-                self.host,
-                self.port,
-                self.user,
-                self.password,
-                job.db_name,
-                job.uuid,
-            )
+            jobs_by_db.setdefault(job.db_name, []).append(job)
+        for db_name, jobs in jobs_by_db.items():
+            db = self.db_by_name[db_name]
+            db.last_activity = time.time()
+            # the connection is in autocommit mode, so the jobs are
+            # committed as enqueued before we ask Odoo to run them
+            enqueued = db.set_jobs_enqueued(job.uuid for job in jobs)
+            for job in jobs:
+                if job.uuid not in enqueued:
+                    # its new state will be notified
+                    continue
+                _logger.info("asking Odoo to run job %s on db %s", job.uuid, db_name)
+                self.dispatcher.dispatch(db_name, job.uuid)
+
+    def _reset_job_later(self, db_name, job_uuid):
+        # called from the dispatcher threads
+        self._jobs_to_reset.append((db_name, job_uuid))
+        try:
+            os.write(self._wakeup_pipe[1], b".")
+        except BlockingIOError:
+            # the pipe is full, the runner is already going to wake up
+            pass
+
+    def reset_jobs_pending(self):
+        """Set back to pending the jobs that could not be dispatched"""
+        uuids_by_db = {}
+        while self._jobs_to_reset:
+            db_name, job_uuid = self._jobs_to_reset.popleft()
+            uuids_by_db.setdefault(db_name, []).append(job_uuid)
+        batches = list(uuids_by_db.items())
+        for index, (db_name, uuids) in enumerate(batches):
+            db = self.db_by_name.get(db_name)
+            if not db:
+                _logger.warning(
+                    "cannot reset jobs %s to %s, db %s is not handled anymore",
+                    ", ".join(uuids),
+                    PENDING,
+                    db_name,
+                )
+                continue
+            try:
+                reset_uuids = db.set_jobs_pending(uuids)
+            except Exception:
+                # the batches not reset are tried again at the next iteration
+                for batch_db_name, batch_uuids in batches[index:]:
+                    self._jobs_to_reset.extend(
+                        (batch_db_name, uuid) for uuid in batch_uuids
+                    )
+                raise
+            for uuid in reset_uuids:
+                self._reset_count += 1
+                _logger.warning(
+                    "state of job %s was reset from %s to %s",
+                    uuid,
+                    ENQUEUED,
+                    PENDING,
+                )
+        now = time.time()
+        if now - self._reset_count_since >= RESET_STATS_INTERVAL:
+            if self._reset_count:
+                _logger.warning(
+                    "%d jobs were reset from %s to %s in the last %d seconds",
+                    self._reset_count,
+                    ENQUEUED,
+                    PENDING,
+                    now - self._reset_count_since,
+                )
+            self._reset_count = 0
+            self._reset_count_since = now
 
     def process_notifications(self):
         for db in self.db_by_name.values():
@@ -449,27 +1144,58 @@ class QueueJobRunner(object):
                 # causing some intermediaries (such as haproxy) to close the
                 # connection, making the jobrunner to restart on a socket error
                 db.keep_alive()
-            while db.conn.notifies:
+            # drain the notifications, a job changing several times in a row
+            # only needs its last state, the jobs whose properties are not in
+            # the notification are read back from the database
+            job_datas_by_uuid = {}
+            notifications = db.conn.notifies[:]
+            del db.conn.notifies[: len(notifications)]
+            if notifications:
+                db.last_activity = time.time()
+            for notification in notifications:
+                if self._stop:
+                    break
+                uuid, job_datas = _parse_notification(notification.payload)
+                if uuid:
+                    job_datas_by_uuid[uuid] = job_datas
+            # the notified jobs hold their latest state
+            db.kept_uuids -= job_datas_by_uuid.keys()
+            uuids = []
+            for uuid, job_datas in job_datas_by_uuid.items():
+                if job_datas:
+                    self.channel_manager.notify(db.db_name, *job_datas)
+                else:
+                    uuids.append(uuid)
+            for i in range(0, len(uuids), NOTIFICATIONS_CHUNK_SIZE):
                 if self._stop:
                     break
-                notification = db.conn.notifies.pop()
-                uuid = notification.payload
-                with db.select_jobs("uuid = %s", (uuid,)) as cr:
-                    job_datas = cr.fetchone()
-                    if job_datas:
+                chunk = uuids[i : i + NOTIFICATIONS_CHUNK_SIZE]
+                found = set()
+                with db.select_jobs("uuid = ANY(%s)", (chunk,)) as cr:
+                    for job_datas in cr:
                         self.channel_manager.notify(db.db_name, *job_datas)
-                    else:
+                        found.add(job_datas[1])
+                for uuid in chunk:
+                    if uuid not in found:
                         self.channel_manager.remove_job(uuid)
 
     def wait_notification(self):
+        if self._jobs_to_reset:
+            # some jobs could not be dispatched, no need to wait
+            return
         for db in self.db_by_name.values():
+            if db.loading:
+                # the initial load is not finished, go on with the next chunk
+                return
             if db.conn.notifies:
                 # something is going on in the queue, no need to wait
                 return
         # wait for something to happen in the queue_job tables
-        # we'll select() on database connections and the stop pipe
+        # we'll select() on database connections, the stop pipe
+        # and the wakeup pipe
         conns = [db.conn for db in self.db_by_name.values()]
         conns.append(self._stop_pipe[0])
+        conns.append(self._wakeup_pipe[0])
         # look if the channels specify a wakeup time
         wakeup_time = self.channel_manager.get_wakeup_time()
         if not wakeup_time:
@@ -479,6 +1205,11 @@ class QueueJobRunner(object):
             timeout = SELECT_TIMEOUT
         else:
             timeout = wakeup_time - _odoo_now()
+        if self.db_discovery_interval:
+            timeout = min(
+                timeout,
+                self._discovered_at + self.db_discovery_interval - time.time(),
+            )
         # wait for a notification or a timeout;
         # if timeout is negative (ie wakeup time in the past),
         # do not wait; this should rarely happen
@@ -496,8 +1227,18 @@ class QueueJobRunner(object):
                         if key.fileobj == self._stop_pipe[0]:
                             # stop-pipe is not a conn so doesn't need poll()
                             continue
+                        if key.fileobj == self._wakeup_pipe[0]:
+                            self._drain_wakeup_pipe()
+                            continue
                         key.fileobj.poll()
 
+    def _drain_wakeup_pipe(self):
+        try:
+            while os.read(self._wakeup_pipe[0], 1024):
+                pass
+        except BlockingIOError:
+            pass
+
     def stop(self):
         _logger.info("graceful stop requested")
         self._stop = True
@@ -510,13 +1251,14 @@ class QueueJobRunner(object):
             # outer loop does exception recovery
             try:
                 _logger.info("initializing database connections")
-                # TODO: how to detect new databases or databases
-                #       on which queue_job is installed after server start?
                 self.initialize_databases()
                 _logger.info("database connections ready")
                 # inner loop does the normal processing
                 while not self._stop:
+                    self.discover_databases()
+                    self.reset_jobs_pending()
                     self.process_notifications()
+                    self.load_jobs()
                     self.run_jobs()
                     self.wait_notification()
             except KeyboardInterrupt:
@@ -531,4 +1273,5 @@ class QueueJobRunner(object):
                 self.close_databases()
                 time.sleep(ERROR_RECOVERY_DELAY)
         self.close_databases(remove_jobs=False)
+        self.dispatcher.shutdown()
         _logger.info("stopped")
@@ -0,0 +1,165 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+"""
+Worker process of the job runner
+
+This module is executed as a script by
+:class:`~odoo.addons.queue_job.jobrunner.runner.ProcessDispatcher`, when
+the job runner is configured with ``dispatcher = process``. It must not use
+relative imports, as the addons path is only known once the configuration
+of the server has been received.
+
+The worker reads pickled messages on the file descriptor given as first
+argument, and writes its answers on the one given as second argument:
+
+* the first message is the ``odoo.tools.config.options`` dictionary of the
+  server which started the worker;
+* the following messages are ``(db_name, job_uuid)`` tuples of enqueued jobs
+  to run; the worker answers each of them with a ``(success, recycle)``
+  tuple once the job is done, ``recycle`` being True when the worker
+  exceeded its soft memory limit and must be replaced.
+
+Each job is run within the ``limit_time_cpu`` and ``limit_time_real`` limits
+of the server, as the requests of the Odoo workers: the job fails when its
+CPU time limit is reached, and the worker exits when its real time limit is
+reached, leaving the job started as when an Odoo worker is killed.
+
+The worker exits when its input is closed.
+"""
+
+import logging
+import os
+import pickle
+import resource
+import signal
+import sys
+import threading
+
+import psutil
+
+import odoo
+from odoo import SUPERUSER_ID, api
+from odoo.tools import config
+
+_logger = logging.getLogger("odoo.addons.queue_job.jobrunner.worker")
+
+# controllers by set of installed modules, see ``_get_controller``
+_controllers = {}
+
+
+def _get_controller(registry):
+    """Return the controller running the jobs of a database
+
+    The route is not used, but the controller is instantiated from the
+    classes inheriting from ``RunJobController`` in the modules installed
+    in the database, as Odoo does when it builds the routing map of a
+    database, so the overrides of ``_try_perform_job`` and friends done by
+    these addons apply.
+    """
+    modules = frozenset(registry._init_modules).union(odoo.conf.server_wide_modules)
+    controller = _controllers.get(modules)
+    if controller is None:
+        from odoo.addons.queue_job.controllers.main import RunJobController
+
+        def is_installed(cls):
+            path = cls.__module__.split(".")
+            return path[:2] == ["odoo", "addons"] and path[2] in modules
+
+        leaves = []
+        to_visit = [RunJobController]
+        while to_visit:
+            cls = to_visit.pop()
+            subclasses = [sub for sub in cls.__subclasses__() if is_installed(sub)]
+            if subclasses:
+                to_visit.extend(subclasses)
+            elif cls not in leaves:
+                leaves.append(cls)
+        if len(leaves) == 1:
+            controller_class = leaves[0]
+        else:
+            controller_class = type("RunJobController", tuple(leaves), {})
+        controller = _controllers[modules] = controller_class()
+    return controller
+
+
+def _cpu_time_exceeded(signum, frame):
+    _logger.info(
+        "queue job worker (%s) CPU time limit (%s) reached.",
+        os.getpid(),
+        config["limit_time_cpu"],
+    )
+    raise Exception("CPU time limit exceeded.")
+
+
+def _real_time_exceeded(signum, frame):
+    _logger.error(
+        "queue job worker (%s) real time limit (%s) reached, exiting.",
+        os.getpid(),
+        config["limit_time_real"],
+    )
+    os._exit(1)
+
+
+def _set_time_limits():
+    # same limits as ``odoo.service.server.Worker`` sets for each request
+    if config["limit_time_cpu"]:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_time = usage.ru_utime + usage.ru_stime
+        __, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(
+            resource.RLIMIT_CPU, (int(cpu_time + config["limit_time_cpu"]), hard)
+        )
+    if config["limit_time_real"]:
+        signal.alarm(int(config["limit_time_real"]))
+
+
+def _reset_time_limits():
+    signal.alarm(0)
+    if config["limit_time_cpu"]:
+        __, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def run_job(db_name, job_uuid):
+    threading.current_thread().dbname = db_name
+    registry = odoo.registry(db_name).check_signaling()
+    _set_time_limits()
+    try:
+        with registry.manage_changes(), registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            _get_controller(registry)._runjob(env, job_uuid)
+    finally:
+        _reset_time_limits()
+
+
+def _memory_exceeded():
+    limit = config["limit_memory_soft"]
+    return bool(limit) and psutil.Process().memory_info().rss > limit
+
+
+def main(read_fd, write_fd):
+    with os.fdopen(read_fd, "rb") as reader, os.fdopen(write_fd, "wb") as writer:
+        config.options.update(pickle.load(reader))
+        odoo.netsvc.init_logger()
+        odoo.modules.module.initialize_sys_path()
+        odoo.service.server.load_server_wide_modules()
+        signal.signal(signal.SIGXCPU, _cpu_time_exceeded)
+        signal.signal(signal.SIGALRM, _real_time_exceeded)
+        _logger.info("queue job worker (%s) started", os.getpid())
+        while True:
+            try:
+                db_name, job_uuid = pickle.load(reader)
+            except EOFError:
+                break
+            try:
+                run_job(db_name, job_uuid)
+                success = True
+            except Exception:
+                _logger.exception("exception while running job %s", job_uuid)
+                success = False
+            pickle.dump((success, _memory_exceeded()), writer)
+            writer.flush()
+        _logger.info("queue job worker (%s) stopped", os.getpid())
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]), int(sys.argv[2]))
@@ -0,0 +1,40 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    # Build the dependency edges of the jobs still waiting for their
+    # dependencies from the "dependencies" json field, the other jobs do not
+    # need them anymore
+    _logger.info("Storing the dependencies of the jobs waiting for other jobs")
+    cr.execute(
+        """
+        INSERT INTO queue_job_dependency (parent_id, child_id, done)
+        SELECT parent.id, child.id, parent.state = 'done'
+        FROM queue_job child
+        JOIN LATERAL
+            json_array_elements_text(
+                child.dependencies::json->'depends_on'
+            ) parent_uuid ON true
+        JOIN queue_job parent
+        ON parent.graph_uuid = child.graph_uuid
+        AND parent.uuid = parent_uuid
+        WHERE child.state = 'wait_dependencies'
+        ON CONFLICT (parent_id, child_id) DO NOTHING
+        """
+    )
+    cr.execute(
+        """
+        UPDATE queue_job child
+        SET dependencies_remaining = counts.remaining
+        FROM (
+            SELECT child_id, count(*) FILTER (WHERE NOT done) AS remaining
+            FROM queue_job_dependency
+            GROUP BY child_id
+        ) counts
+        WHERE child.id = counts.child_id
+        """
+    )
@@ -0,0 +1,12 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import logging
+
+from odoo.addons.queue_job.post_init_hook import create_notify_triggers
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    _logger.info("Replacing the queue_job_notify trigger")
+    create_notify_triggers(cr)
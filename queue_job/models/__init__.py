@@ -1,5 +1,8 @@
 from . import base
 from . import ir_model_fields
 from . import queue_job
+from . import queue_job_archive
 from . import queue_job_channel
+from . import queue_job_dependency
 from . import queue_job_function
+from . import queue_job_history
@@ -26,6 +26,7 @@ class Base(models.AbstractModel):
         description=None,
         channel=None,
         identity_key=None,
+        debounce=None,
     ):
         """Return a ``DelayableRecordset``
 
@@ -59,6 +60,7 @@ class Base(models.AbstractModel):
             description=description,
             channel=channel,
             identity_key=identity_key,
+            debounce=debounce,
         )
 
     def delayable(
@@ -69,6 +71,7 @@ class Base(models.AbstractModel):
         description=None,
         channel=None,
         identity_key=None,
+        debounce=None,
     ):
         """Return a ``Delayable``
 
@@ -129,6 +132,13 @@ class Base(models.AbstractModel):
                              string, either a function that takes the job as
                              argument (see :py:func:`..job.identity_exact`).
                              the new job will not be added.
+        :param debounce: number of seconds to wait for other jobs with the
+                         same identity key before executing the job. The job
+                         is delayed by this number of seconds, and each new
+                         job with the same key pushes the existing job's eta
+                         by the same delay, up to the "Debounce Max. Delay"
+                         of the job function. If None, the "Debounce Window"
+                         of the job function is used.
         :return: instance of a Delayable
         :rtype: :class:`odoo.addons.queue_job.job.Delayable`
         """
@@ -140,6 +150,7 @@ class Base(models.AbstractModel):
             description=description,
             channel=channel,
             identity_key=identity_key,
+            debounce=debounce,
         )
 
     def _patch_job_auto_delay(self, method_name, context_key=None):
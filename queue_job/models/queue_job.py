@@ -2,12 +2,16 @@
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 
 import logging
+import os
 import random
+import time
 from datetime import datetime, timedelta
 
+from psycopg2 import errors
+
 from odoo import _, api, exceptions, fields, models
 from odoo.osv import expression
-from odoo.tools import config, html_escape
+from odoo.tools import config, html_escape, ormcache
 
 from odoo.addons.base_sparse_field.models.fields import Serialized
 
@@ -17,6 +21,7 @@ from ..fields import JobSerialized
 from ..job import (
     CANCELLED,
     DONE,
+    ENQUEUED,
     FAILED,
     PENDING,
     STARTED,
@@ -24,9 +29,32 @@ from ..job import (
     WAIT_DEPENDENCIES,
     Job,
 )
+from ..jobrunner import queue_job_config
 
 _logger = logging.getLogger(__name__)
 
+IDENTITY_KEY_UNIQUE_INDEX = "queue_job_identity_key_state_unique_index"
+# jobs waiting to be executed, out of a graph, cannot share a key
+IDENTITY_KEY_UNIQUE_WHERE = (
+    "state in ('pending', 'enqueued', 'wait_dependencies') "
+    "AND identity_key IS NOT NULL AND graph_uuid IS NULL"
+)
+
+AUTOVACUUM_INDEX = "queue_job_autovacuum_index"
+
+
+def identity_key_unique_enabled():
+    """Return whether the identity keys are enforced by a unique index
+
+    Enabled with the ``ODOO_QUEUE_JOB_IDENTITY_KEY_UNIQUE`` environment
+    variable or the ``identity_key_unique`` option of the ``[queue_job]``
+    section of the configuration file.
+    """
+    value = os.environ.get("ODOO_QUEUE_JOB_IDENTITY_KEY_UNIQUE") or (
+        queue_job_config.get("identity_key_unique")
+    )
+    return str(value).lower() in ("1", "true", "yes", "on")
+
 
 class QueueJob(models.Model):
     """Model storing the jobs to be executed."""
@@ -39,6 +67,7 @@ class QueueJob(models.Model):
     _order = "date_created DESC, date_done DESC"
 
     _removal_interval = 30  # days
+    _autovacuum_batch_size = 1000
     _default_related_action = "related_action_open_record"
 
     # This must be passed in a context key "_job_edit_sentinel" to write on
@@ -129,6 +158,8 @@ class QueueJob(models.Model):
 
     identity_key = fields.Char(readonly=True)
     worker_pid = fields.Integer(readonly=True)
+    # count of parent jobs not done yet, see ``queue.job.dependency``
+    dependencies_remaining = fields.Integer(readonly=True)
 
     def init(self):
         self._cr.execute(
@@ -141,6 +172,54 @@ class QueueJob(models.Model):
                 "ON queue_job (identity_key) WHERE state in ('pending', "
                 "'enqueued', 'wait_dependencies') AND identity_key IS NOT NULL;"
             )
+        self._cr.execute(
+            "SELECT indexname FROM pg_indexes WHERE indexname = %s ",
+            (AUTOVACUUM_INDEX,),
+        )
+        if not self._cr.fetchone():
+            # matches the predicate of ``_autovacuum_channel``
+            self._cr.execute(
+                "CREATE INDEX {} ON queue_job "
+                "(channel, COALESCE(date_done, date_cancelled)) "
+                "WHERE state in ('done', 'cancelled')".format(AUTOVACUUM_INDEX)
+            )
+        if identity_key_unique_enabled():
+            self._init_identity_key_unique_index()
+
+    def _init_identity_key_unique_index(self):
+        self._cr.execute(
+            "SELECT indexname FROM pg_indexes WHERE indexname = %s ",
+            (IDENTITY_KEY_UNIQUE_INDEX,),
+        )
+        if self._cr.fetchone():
+            return
+        self._cr.execute(
+            "SELECT identity_key FROM queue_job WHERE {} "
+            "GROUP BY identity_key HAVING count(*) > 1 LIMIT 1".format(
+                IDENTITY_KEY_UNIQUE_WHERE
+            )
+        )
+        if self._cr.fetchone():
+            _logger.warning(
+                "Cannot create index %s: several jobs waiting to be executed "
+                "share an identity key, the identity keys are not enforced "
+                "until they are executed and the module is updated",
+                IDENTITY_KEY_UNIQUE_INDEX,
+            )
+            return
+        self._cr.execute(
+            "CREATE UNIQUE INDEX {} ON queue_job (identity_key) WHERE {}".format(
+                IDENTITY_KEY_UNIQUE_INDEX, IDENTITY_KEY_UNIQUE_WHERE
+            )
+        )
+
+    @ormcache()
+    def _has_identity_key_unique_index(self):
+        self._cr.execute(
+            "SELECT indexname FROM pg_indexes WHERE indexname = %s ",
+            (IDENTITY_KEY_UNIQUE_INDEX,),
+        )
+        return bool(self._cr.fetchone())
 
     @api.depends("records")
     def _compute_record_ids(self):
@@ -149,20 +228,28 @@ class QueueJob(models.Model):
 
     @api.depends("dependencies")
     def _compute_dependency_graph(self):
+        graph_uuids = [uuid for uuid in self.mapped("graph_uuid") if uuid]
         jobs_groups = self.env["queue.job"].read_group(
-            [
-                (
-                    "graph_uuid",
-                    "in",
-                    [uuid for uuid in self.mapped("graph_uuid") if uuid],
-                )
-            ],
+            [("graph_uuid", "in", graph_uuids)],
             ["graph_uuid", "ids:array_agg(id)"],
             ["graph_uuid"],
         )
         ids_per_graph_uuid = {
             group["graph_uuid"]: group["ids"] for group in jobs_groups
         }
+        # the jobs of the graph already moved to the archive are part of it,
+        # with the id they had in queue_job
+        archived_per_graph_uuid = {}
+        if graph_uuids:
+            archived_jobs = (
+                self.env["queue.job.archive"]
+                .sudo()
+                .search([("graph_uuid", "in", graph_uuids), ("job_id", "!=", False)])
+            )
+            for archived_job in archived_jobs:
+                archived_per_graph_uuid.setdefault(archived_job.graph_uuid, []).append(
+                    archived_job
+                )
         for record in self:
             if not record.graph_uuid:
                 record.dependency_graph = {}
@@ -172,23 +259,35 @@ class QueueJob(models.Model):
             if not graph_jobs:
                 record.dependency_graph = {}
                 continue
+            archived_jobs = archived_per_graph_uuid.get(record.graph_uuid, [])
 
             graph_ids = {graph_job.uuid: graph_job.id for graph_job in graph_jobs}
+            graph_ids.update(
+                {
+                    archived_job.uuid: archived_job.job_id
+                    for archived_job in archived_jobs
+                }
+            )
             graph_jobs_by_ids = {graph_job.id: graph_job for graph_job in graph_jobs}
+            graph_jobs_by_ids.update(
+                {archived_job.job_id: archived_job for archived_job in archived_jobs}
+            )
 
             graph = Graph()
-            for graph_job in graph_jobs:
-                graph.add_vertex(graph_job.id)
-                for parent_uuid in graph_job.dependencies["depends_on"]:
+            for graph_job in list(graph_jobs) + archived_jobs:
+                graph_id = graph_ids[graph_job.uuid]
+                graph.add_vertex(graph_id)
+                dependencies = graph_job.dependencies or {}
+                for parent_uuid in dependencies.get("depends_on", []):
                     parent_id = graph_ids.get(parent_uuid)
                     if not parent_id:
                         continue
-                    graph.add_edge(parent_id, graph_job.id)
-                for child_uuid in graph_job.dependencies["reverse_depends_on"]:
+                    graph.add_edge(parent_id, graph_id)
+                for child_uuid in dependencies.get("reverse_depends_on", []):
                     child_id = graph_ids.get(child_uuid)
                     if not child_id:
                         continue
-                    graph.add_edge(graph_job.id, child_id)
+                    graph.add_edge(graph_id, child_id)
 
             record.dependency_graph = {
                 # list of ids
@@ -202,6 +301,12 @@ class QueueJob(models.Model):
 
     def _dependency_graph_vis_node(self):
         """Return the node as expected by the JobDirectedGraph widget"""
+        return self._dependency_graph_vis_node_values(
+            self.id, self.display_name, self.func_string, self.state
+        )
+
+    @api.model
+    def _dependency_graph_vis_node_values(self, node_id, name, func_string, state):
         default = ("#D2E5FF", "#2B7CE9")
         colors = {
             DONE: ("#C2FABC", "#4AD63A"),
@@ -209,14 +314,14 @@ class QueueJob(models.Model):
             STARTED: ("#FFFF00", "#FFA500"),
         }
         return {
-            "id": self.id,
+            "id": node_id,
             "title": "<strong>%s</strong><br/>%s"
             % (
-                html_escape(self.display_name),
-                html_escape(self.func_string),
+                html_escape(name),
+                html_escape(func_string),
             ),
-            "color": colors.get(self.state, default)[0],
-            "border": colors.get(self.state, default)[1],
+            "color": colors.get(state, default)[0],
+            "border": colors.get(state, default)[1],
             "shadow": True,
         }
 
@@ -283,6 +388,65 @@ class QueueJob(models.Model):
             )
         return result
 
+    @ormcache()
+    def _has_write_override(self):
+        """Return whether a module overrides ``write`` of the jobs"""
+        for cls in type(self).mro():
+            if "write" in vars(cls):
+                return cls is not QueueJob
+        return False
+
+    def _can_write_in_sql(self, vals):
+        """Return whether the values can be written without ``write``
+
+        It is the case when no module overrides ``write``, the job is not set
+        to failed (which posts a message), and the values are only plain
+        columns which are not tracked and do not trigger any recomputation.
+        """
+        if self._has_write_override() or vals.get("state") == FAILED:
+            return False
+        for name in vals:
+            field = self._fields.get(name)
+            if (
+                not field
+                or not field.column_type
+                or not field.store
+                or field.tracking
+                or name in self._protected_fields
+                or name == "user_id"
+                or self.pool.field_triggers.get(field)
+            ):
+                return False
+        return True
+
+    def _write_in_sql(self, vals):
+        """Write the values with a single UPDATE statement
+
+        It must only be used when :meth:`_can_write_in_sql` allows it.
+        """
+        self.flush_recordset(list(vals))
+        self.env.cr.execute(
+            "UPDATE queue_job SET {} WHERE id IN %s".format(
+                ", ".join('"{}" = %s'.format(name) for name in vals)
+            ),
+            [
+                self._fields[name].convert_to_column(value, self, vals)
+                for name, value in vals.items()
+            ]
+            + [tuple(self.ids)],
+        )
+        self.invalidate_recordset(list(vals))
+
+    def get_formview_action(self, access_uid=None):
+        # the nodes of the dependency graph can be jobs moved to the archive
+        if len(self) == 1 and not self.exists():
+            archived = self.env["queue.job.archive"].search(
+                [("job_id", "=", self.id)], limit=1
+            )
+            if archived:
+                return archived.get_formview_action(access_uid=access_uid)
+        return super().get_formview_action(access_uid=access_uid)
+
     def open_related_action(self):
         """Open the related action associated to the job"""
         self.ensure_one()
@@ -309,6 +473,73 @@ class QueueJob(models.Model):
         )
         return action
 
+    @api.model
+    def _get_jobs_by_identity_key(self, identity_keys):
+        """Find the jobs not executed yet having one of the identity keys
+
+        All the keys are looked up with a single query, which can use the
+        ``queue_job_identity_key_state_partial_index`` index.
+
+        :returns: dict with an identity key as key and a (sudo) record as
+                  value, for each key having a job
+        """
+        if not identity_keys:
+            return {}
+        records = self.sudo().search(
+            [
+                ("identity_key", "in", list(set(identity_keys))),
+                ("state", "in", [WAIT_DEPENDENCIES, PENDING, ENQUEUED]),
+            ]
+        )
+        jobs_by_key = {}
+        for record in records:
+            jobs_by_key.setdefault(record.identity_key, record)
+        return jobs_by_key
+
+    @api.model
+    def _create_with_unique_identity_key(self, vals):
+        """Create a single job, unless a job with the same key is waiting
+
+        The job is created in a savepoint, the
+        ``queue_job_identity_key_state_unique_index`` index prevents two
+        transactions enqueuing the same key at the same time to both create
+        their job. When the index is violated, the job with the same key is
+        returned instead. If that job has been created by a transaction
+        which is not visible from this one, the violation is raised.
+
+        :returns: tuple with the (sudo) record of the job, and a boolean
+                  telling if it is the newly created one
+        """
+        job_model = self.sudo()
+        try:
+            with self.env.cr.savepoint():
+                record = job_model.create(vals)
+                record.flush_recordset()
+        except errors.UniqueViolation as err:
+            if err.diag.constraint_name != IDENTITY_KEY_UNIQUE_INDEX:
+                raise
+            job_model.invalidate_model()
+            existing = job_model._get_jobs_by_identity_key([vals["identity_key"]])
+            if not existing:
+                raise
+            return existing[vals["identity_key"]], False
+        return record, True
+
+    def _debounce(self, window, max_delay=0):
+        """Postpone the pending jobs by ``window`` seconds from now
+
+        Called when a job with the same identity key is enqueued again. The
+        eta is never moved back, and never set beyond ``max_delay`` seconds
+        after the creation of the job (when ``max_delay`` is not 0).
+        """
+        now = fields.Datetime.now()
+        for record in self.filtered(lambda record: record.state == PENDING):
+            eta = now + timedelta(seconds=window)
+            if max_delay:
+                eta = min(eta, record.date_created + timedelta(seconds=max_delay))
+            if not record.eta or eta > record.eta:
+                record.eta = eta
+
     def _change_job_state(self, state, result=None):
         """Change the state of the `Job` object
 
@@ -343,9 +574,50 @@ class QueueJob(models.Model):
 
     def requeue(self):
         jobs_to_requeue = self.filtered(lambda job_: job_.state != WAIT_DEPENDENCIES)
+        conflicts = jobs_to_requeue._get_identity_key_conflicts()
+        if conflicts:
+            raise exceptions.UserError(
+                _(
+                    "The following jobs cannot be requeued, another job with "
+                    "the same identity key is waiting to be executed:\n%s"
+                )
+                % "\n".join(
+                    "%s (%s)" % (record.uuid, record.identity_key)
+                    for record in conflicts
+                )
+            )
         jobs_to_requeue._change_job_state(PENDING)
         return jobs_to_requeue
 
+    def _get_identity_key_conflicts(self):
+        """Return the jobs which cannot be requeued due to their identity key
+
+        When the identity keys are unique, a job cannot be requeued while
+        another job with the same key waits to be executed.
+        """
+        candidates = self.filtered(
+            lambda record: record.identity_key and not record.graph_uuid
+        )
+        if not candidates or not self._has_identity_key_unique_index():
+            return self.browse()
+        self.flush_model(["identity_key", "graph_uuid", "state"])
+        self.env.cr.execute(
+            "SELECT identity_key FROM queue_job WHERE {} "
+            "AND identity_key IN %s AND id NOT IN %s".format(IDENTITY_KEY_UNIQUE_WHERE),
+            (tuple(set(candidates.mapped("identity_key"))), tuple(candidates.ids)),
+        )
+        queued_keys = {row[0] for row in self.env.cr.fetchall()}
+        conflicts = self.browse()
+        # the jobs which are already queued keep their key
+        for record in candidates.sorted(
+            lambda record: record.state not in (PENDING, ENQUEUED, WAIT_DEPENDENCIES)
+        ):
+            if record.identity_key in queued_keys:
+                conflicts |= record
+            else:
+                queued_keys.add(record.identity_key)
+        return conflicts
+
     def _message_post_on_failure(self):
         # subscribe the users now to avoid to subscribe them
         # at every job creation
@@ -395,28 +667,109 @@ class QueueJob(models.Model):
         """Delete all jobs done based on the removal interval defined on the
            channel
 
+        The jobs of channels which are not configured use the removal
+        interval of their closest configured parent channel.
+
         Called from a cron.
         """
-        for channel in self.env["queue.job.channel"].search([]):
-            deadline = datetime.now() - timedelta(days=int(channel.removal_interval))
-            while True:
-                jobs = self.search(
-                    [
-                        "|",
-                        ("date_done", "<=", deadline),
-                        ("date_cancelled", "<=", deadline),
-                        ("channel", "=", channel.complete_name),
-                    ],
-                    limit=1000,
+        start = time.monotonic()
+        now = datetime.now()
+        removal_intervals = {
+            channel.complete_name: channel.removal_interval
+            for channel in self.env["queue.job.channel"].search([])
+        }
+        deleted = 0
+        for model in (self, self.env["queue.job.archive"]):
+            for channel in model._autovacuum_channel_names():
+                removal_interval = self._get_removal_interval(
+                    removal_intervals, channel
                 )
-                if jobs:
-                    jobs.unlink()
+                deadline = now - timedelta(days=int(removal_interval))
+                while True:
+                    job_ids = model._autovacuum_channel(
+                        channel, deadline, self._autovacuum_batch_size
+                    )
+                    if not job_ids:
+                        break
+                    deleted += len(job_ids)
                     if not config["test_enable"]:
                         self.env.cr.commit()  # pylint: disable=E8102
-                else:
-                    break
+        duration = time.monotonic() - start
+        _logger.info(
+            "autovacuum deleted %d jobs in %.2fs (%.0f jobs/s)",
+            deleted,
+            duration,
+            deleted / duration if duration else 0,
+        )
         return True
 
+    @api.model
+    def _get_removal_interval(self, removal_intervals, channel):
+        """Return the removal interval of the closest configured channel
+
+        ``removal_intervals`` are the removal intervals by complete name of
+        the configured channels. The root channel is used when no parent of
+        the channel is configured.
+        """
+        while channel not in removal_intervals and "." in channel:
+            channel = channel.rsplit(".", 1)[0]
+        return removal_intervals.get(
+            channel, removal_intervals.get("root", self._removal_interval)
+        )
+
+    @api.model
+    def _autovacuum_channel_names(self):
+        """Return the channels of the jobs done or cancelled"""
+        self.env.flush_all()
+        self.env.cr.execute(
+            "SELECT DISTINCT channel FROM queue_job"
+            " WHERE state in ('done', 'cancelled') AND channel IS NOT NULL"
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _autovacuum_channel(self, channel, deadline, limit):
+        """Delete a batch of jobs of a channel done or cancelled before deadline
+
+        The jobs are deleted in SQL, along with their messages, followers
+        and activities. Return the ids of the deleted jobs.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(
+            "DELETE FROM queue_job WHERE id IN ("
+            " SELECT id FROM queue_job"
+            " WHERE channel = %s AND state in ('done', 'cancelled')"
+            " AND COALESCE(date_done, date_cancelled) <= %s"
+            " LIMIT %s FOR UPDATE SKIP LOCKED"
+            ") RETURNING id",
+            (channel, deadline, limit),
+        )
+        job_ids = tuple(row[0] for row in self.env.cr.fetchall())
+        if job_ids:
+            self._autovacuum_mail(job_ids)
+            self.invalidate_model()
+        return job_ids
+
+    def _autovacuum_mail(self, job_ids):
+        """Delete the records of the mail models linked to deleted jobs"""
+        # the attachments go through the ORM to remove their files
+        self.env["ir.attachment"].sudo().search(
+            [("res_model", "=", self._name), ("res_id", "in", job_ids)]
+        ).unlink()
+        self.env.cr.execute(
+            "DELETE FROM mail_message WHERE model = %s AND res_id IN %s",
+            (self._name, job_ids),
+        )
+        self.env.cr.execute(
+            "DELETE FROM mail_followers WHERE res_model = %s AND res_id IN %s",
+            (self._name, job_ids),
+        )
+        self.env.cr.execute(
+            "DELETE FROM mail_activity WHERE res_model = %s AND res_id IN %s",
+            (self._name, job_ids),
+        )
+        for model in ("mail.message", "mail.followers", "mail.activity"):
+            self.env[model].invalidate_model()
+
     def requeue_stuck_jobs(self, enqueued_delta=1, started_delta=0):
         """Fix jobs that are in a bad states
 
@@ -431,9 +784,18 @@ class QueueJob(models.Model):
         """
         if started_delta == -1:
             started_delta = (config["limit_time_real"] // 60) + 1
-        return self._get_stuck_jobs_to_requeue(
+        stuck_jobs = self._get_stuck_jobs_to_requeue(
             enqueued_delta=enqueued_delta, started_delta=started_delta
-        ).requeue()
+        )
+        conflicts = stuck_jobs._get_identity_key_conflicts()
+        for record in conflicts:
+            _logger.warning(
+                "stuck job %s not requeued, another job with the identity "
+                "key %s is waiting to be executed",
+                record.uuid,
+                record.identity_key,
+            )
+        return (stuck_jobs - conflicts).requeue()
 
     def _get_stuck_jobs_domain(self, queue_dl, started_dl):
         domain = []
@@ -0,0 +1,230 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+from odoo import api, fields, models
+from odoo.tools import config
+
+from odoo.addons.base_sparse_field.models.fields import Serialized
+
+from ..job import CANCELLED, DONE, STATES
+
+_logger = logging.getLogger(__name__)
+
+# columns moved from queue_job to queue_job_archive
+ARCHIVE_COLUMNS = (
+    "uuid",
+    "graph_uuid",
+    "user_id",
+    "company_id",
+    "name",
+    "model_name",
+    "method_name",
+    "records",
+    "args",
+    "kwargs",
+    "func_string",
+    "state",
+    "priority",
+    "exc_name",
+    "exc_message",
+    "exc_info",
+    "result",
+    "date_created",
+    "date_started",
+    "date_enqueued",
+    "date_done",
+    "exec_time",
+    "date_cancelled",
+    "eta",
+    "retry",
+    "max_retries",
+    "channel_method_name",
+    "job_function_id",
+    "channel",
+    "identity_key",
+    "worker_pid",
+    "dependencies",
+)
+
+
+class QueueJobArchive(models.Model):
+    """Jobs done or cancelled, moved out of the ``queue_job`` table
+
+    The table is append-only: the jobs are moved by :meth:`archive_jobs`,
+    called from a cron, and deleted by the autovacuum of ``queue.job``
+    according to the removal interval of their channel. This keeps the
+    ``queue_job`` table, used by the job runner, small. The messages and
+    attachments of the jobs are kept until the archived jobs are deleted.
+    """
+
+    _name = "queue.job.archive"
+    _description = "Archived Queue Job"
+    _log_access = False
+    _order = "date_created DESC, date_done DESC"
+
+    _archive_delay = 60  # minutes
+
+    job_id = fields.Integer(string="Job ID", readonly=True, index=True)
+    uuid = fields.Char(string="UUID", readonly=True, index=True)
+    graph_uuid = fields.Char(string="Graph UUID", readonly=True, index=True)
+    user_id = fields.Many2one(comodel_name="res.users", string="User ID", readonly=True)
+    company_id = fields.Many2one(
+        comodel_name="res.company", string="Company", readonly=True
+    )
+    name = fields.Char(string="Description", readonly=True)
+    model_name = fields.Char(string="Model", readonly=True)
+    method_name = fields.Char(readonly=True)
+    records = fields.Text(readonly=True)
+    args = fields.Text(readonly=True)
+    kwargs = fields.Text(readonly=True)
+    func_string = fields.Char(string="Task", readonly=True)
+    state = fields.Selection(STATES, readonly=True)
+    priority = fields.Integer(readonly=True)
+    exc_name = fields.Char(string="Exception", readonly=True)
+    exc_message = fields.Char(string="Exception Message", readonly=True)
+    exc_info = fields.Text(string="Exception Info", readonly=True)
+    result = fields.Text(readonly=True)
+    date_created = fields.Datetime(string="Created Date", readonly=True)
+    date_started = fields.Datetime(string="Start Date", readonly=True)
+    date_enqueued = fields.Datetime(string="Enqueue Time", readonly=True)
+    date_done = fields.Datetime(readonly=True)
+    exec_time = fields.Float(
+        string="Execution Time (avg)", group_operator="avg", readonly=True
+    )
+    date_cancelled = fields.Datetime(readonly=True)
+    eta = fields.Datetime(string="Execute only after", readonly=True)
+    retry = fields.Integer(string="Current try", readonly=True)
+    max_retries = fields.Integer(readonly=True)
+    channel_method_name = fields.Char(string="Complete Method Name", readonly=True)
+    job_function_id = fields.Many2one(
+        comodel_name="queue.job.function",
+        string="Job Function",
+        readonly=True,
+        ondelete="set null",
+    )
+    channel = fields.Char(readonly=True)
+    identity_key = fields.Char(readonly=True)
+    worker_pid = fields.Integer(readonly=True)
+    dependencies = Serialized(readonly=True)
+    date_archived = fields.Datetime(readonly=True)
+
+    def init(self):
+        self._cr.execute(
+            "SELECT indexname FROM pg_indexes WHERE indexname = %s ",
+            ("queue_job_archive_autovacuum_index",),
+        )
+        if not self._cr.fetchone():
+            self._cr.execute(
+                "CREATE INDEX queue_job_archive_autovacuum_index "
+                "ON queue_job_archive (channel, COALESCE(date_done, date_cancelled))"
+            )
+
+    def _dependency_graph_vis_node(self):
+        """Return the node of the archived job in the graph of a job"""
+        return self.env["queue.job"]._dependency_graph_vis_node_values(
+            self.job_id, self.display_name, self.func_string, self.state
+        )
+
+    @api.model
+    def _archive_columns(self):
+        """Return the columns moved from ``queue_job`` to the archive
+
+        Modules adding a column to ``queue.job`` extend it to keep the column
+        in the archive, along with a field of the same name on
+        ``queue.job.archive``.
+        """
+        return list(ARCHIVE_COLUMNS)
+
+    @api.model
+    def archive_jobs(self):
+        """Move the jobs done or cancelled to the archive
+
+        Only the jobs finished for more than ``_archive_delay`` minutes are
+        moved. Called from a cron.
+        """
+        start = time.monotonic()
+        deadline = datetime.now() - timedelta(minutes=self._archive_delay)
+        archived = 0
+        while True:
+            job_ids = self._archive_batch(
+                deadline, self.env["queue.job"]._autovacuum_batch_size
+            )
+            if not job_ids:
+                break
+            archived += len(job_ids)
+            if not config["test_enable"]:
+                self.env.cr.commit()  # pylint: disable=E8102
+        duration = time.monotonic() - start
+        _logger.info(
+            "archived %d jobs in %.2fs (%.0f jobs/s)",
+            archived,
+            duration,
+            archived / duration if duration else 0,
+        )
+        return True
+
+    @api.model
+    def _archive_batch(self, deadline, limit):
+        """Move a batch of jobs finished before deadline to the archive
+
+        The rows are deleted from ``queue_job`` and inserted in
+        ``queue_job_archive`` in a single statement. The messages, followers,
+        activities and attachments of the jobs are left untouched, they are
+        deleted with the archived jobs. Return the ids of the jobs moved.
+        """
+        self.env.flush_all()
+        columns = ", ".join('"{}"'.format(name) for name in self._archive_columns())
+        self.env.cr.execute(
+            "WITH moved AS ("
+            " DELETE FROM queue_job WHERE id IN ("
+            "  SELECT id FROM queue_job WHERE state in %s"
+            "  AND COALESCE(date_done, date_cancelled) <= %s"
+            "  LIMIT %s FOR UPDATE SKIP LOCKED"
+            " ) RETURNING id, {columns}"
+            "), archived AS ("
+            " INSERT INTO queue_job_archive (job_id, {columns}, date_archived)"
+            " SELECT id, {columns}, now() at time zone 'UTC' FROM moved"
+            ") SELECT id FROM moved".format(columns=columns),
+            ((DONE, CANCELLED), deadline, limit),
+        )
+        job_ids = tuple(row[0] for row in self.env.cr.fetchall())
+        if job_ids:
+            self.env["queue.job"].invalidate_model()
+            self.invalidate_model()
+        return job_ids
+
+    @api.model
+    def _autovacuum_channel_names(self):
+        """Return the channels of the archived jobs"""
+        self.env.flush_all()
+        self.env.cr.execute(
+            "SELECT DISTINCT channel FROM queue_job_archive WHERE channel IS NOT NULL"
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _autovacuum_channel(self, channel, deadline, limit):
+        """Delete a batch of archived jobs of a channel finished before deadline
+
+        The messages, followers, activities and attachments of the jobs are
+        deleted with them. Return the ids of the deleted archived jobs.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(
+            "DELETE FROM queue_job_archive WHERE id IN ("
+            " SELECT id FROM queue_job_archive"
+            " WHERE channel = %s AND COALESCE(date_done, date_cancelled) <= %s"
+            " LIMIT %s FOR UPDATE SKIP LOCKED"
+            ") RETURNING id, job_id",
+            (channel, deadline, limit),
+        )
+        rows = self.env.cr.fetchall()
+        job_ids = tuple(job_id for __, job_id in rows if job_id)
+        if job_ids:
+            self.env["queue.job"]._autovacuum_mail(job_ids)
+        if rows:
+            self.invalidate_model()
+        return tuple(archive_id for archive_id, __ in rows)
@@ -0,0 +1,37 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from odoo import fields, models
+
+
+class QueueJobDependency(models.Model):
+    """Dependency between two jobs of a graph
+
+    The dependencies of a job are kept in its ``dependencies`` field too,
+    this table is used to resolve them: when a parent job is done, its edges
+    are marked as done and the ``dependencies_remaining`` counter of each
+    child is decremented, the children reaching 0 are set to pending.
+    """
+
+    _name = "queue.job.dependency"
+    _description = "Queue Job Dependency"
+    _log_access = False
+
+    parent_id = fields.Many2one(
+        comodel_name="queue.job", required=True, readonly=True, ondelete="cascade"
+    )
+    child_id = fields.Many2one(
+        comodel_name="queue.job",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="cascade",
+    )
+    done = fields.Boolean(readonly=True)
+
+    _sql_constraints = [
+        (
+            "parent_child_uniq",
+            "unique(parent_id, child_id)",
+            "A job can depend only once on another job.",
+        )
+    ]
@@ -28,7 +28,10 @@ class QueueJobFunction(models.Model):
         "related_action_enable "
         "related_action_func_name "
         "related_action_kwargs "
-        "job_function_id ",
+        "job_function_id "
+        "coalesce_limit "
+        "debounce_window "
+        "debounce_max_delay ",
     )
 
     def _default_channel(self):
@@ -80,6 +83,44 @@ class QueueJobFunction(models.Model):
         "See the module description for details.",
     )
 
+    coalesce_limit = fields.Integer(
+        string="Coalesce Limit",
+        default=0,
+        help="Maximum number of pending jobs of this function executed "
+        "together, by calling the method once on the union of their records. "
+        "Only the jobs with the same arguments, user and company, which are "
+        "not part of a graph, are executed together. "
+        "0 or 1 executes the jobs one by one.",
+    )
+
+    debounce_window = fields.Integer(
+        string="Debounce Window",
+        default=0,
+        help="Number of seconds to wait for other jobs with the same identity "
+        "key before executing a job. Enqueuing a job with the identity key of "
+        "a pending job postpones the pending job by this number of seconds "
+        "instead of creating a new job. 0 disables the debounce.",
+    )
+    debounce_max_delay = fields.Integer(
+        string="Debounce Max. Delay",
+        default=0,
+        help="Maximum number of seconds a debounced job can be postponed "
+        "after its creation. 0 means no maximum.",
+    )
+
+    _sql_constraints = [
+        (
+            "coalesce_limit_positive",
+            "CHECK (coalesce_limit >= 0)",
+            "The coalesce limit cannot be negative.",
+        ),
+        (
+            "debounce_positive",
+            "CHECK (debounce_window >= 0 AND debounce_max_delay >= 0)",
+            "The debounce window and maximum delay cannot be negative.",
+        ),
+    ]
+
     @api.depends("model_id.model", "method")
     def _compute_name(self):
         for record in self:
@@ -149,6 +190,9 @@ class QueueJobFunction(models.Model):
             related_action_func_name=None,
             related_action_kwargs={},
             job_function_id=None,
+            coalesce_limit=0,
+            debounce_window=0,
+            debounce_max_delay=0,
         )
 
     def _parse_retry_pattern(self):
@@ -182,6 +226,9 @@ class QueueJobFunction(models.Model):
             related_action_func_name=config.related_action.get("func_name"),
             related_action_kwargs=config.related_action.get("kwargs", {}),
             job_function_id=config.id,
+            coalesce_limit=config.coalesce_limit,
+            debounce_window=config.debounce_window,
+            debounce_max_delay=config.debounce_max_delay,
         )
 
     def _retry_pattern_format_error_message(self):
@@ -0,0 +1,109 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from odoo import _, fields, models, tools
+
+from ..job import STATES
+
+# columns of the jobs listed from both queue_job and queue_job_archive
+HISTORY_COLUMNS = (
+    "uuid",
+    "graph_uuid",
+    "user_id",
+    "company_id",
+    "name",
+    "model_name",
+    "method_name",
+    "func_string",
+    "state",
+    "priority",
+    "exc_name",
+    "exc_message",
+    "exc_info",
+    "result",
+    "date_created",
+    "date_started",
+    "date_enqueued",
+    "date_done",
+    "exec_time",
+    "date_cancelled",
+    "eta",
+    "retry",
+    "job_function_id",
+    "channel",
+    "identity_key",
+)
+
+
+class QueueJobHistory(models.Model):
+    """Jobs of ``queue_job`` and ``queue_job_archive``, searched together
+
+    The SQL view is the union of both tables, the archived jobs keep the id
+    they had in ``queue_job``.
+    """
+
+    _name = "queue.job.history"
+    _description = "Job History"
+    _auto = False
+    _order = "date_created DESC, date_done DESC"
+
+    uuid = fields.Char(string="UUID", readonly=True)
+    graph_uuid = fields.Char(string="Graph UUID", readonly=True)
+    user_id = fields.Many2one(comodel_name="res.users", string="User ID", readonly=True)
+    company_id = fields.Many2one(
+        comodel_name="res.company", string="Company", readonly=True
+    )
+    name = fields.Char(string="Description", readonly=True)
+    model_name = fields.Char(string="Model", readonly=True)
+    method_name = fields.Char(readonly=True)
+    func_string = fields.Char(string="Task", readonly=True)
+    state = fields.Selection(STATES, readonly=True)
+    priority = fields.Integer(readonly=True)
+    exc_name = fields.Char(string="Exception", readonly=True)
+    exc_message = fields.Char(string="Exception Message", readonly=True)
+    exc_info = fields.Text(string="Exception Info", readonly=True)
+    result = fields.Text(readonly=True)
+    date_created = fields.Datetime(string="Created Date", readonly=True)
+    date_started = fields.Datetime(string="Start Date", readonly=True)
+    date_enqueued = fields.Datetime(string="Enqueue Time", readonly=True)
+    date_done = fields.Datetime(readonly=True)
+    exec_time = fields.Float(
+        string="Execution Time (avg)", group_operator="avg", readonly=True
+    )
+    date_cancelled = fields.Datetime(readonly=True)
+    eta = fields.Datetime(string="Execute only after", readonly=True)
+    retry = fields.Integer(string="Current try", readonly=True)
+    job_function_id = fields.Many2one(
+        comodel_name="queue.job.function", string="Job Function", readonly=True
+    )
+    channel = fields.Char(readonly=True)
+    identity_key = fields.Char(readonly=True)
+    archived = fields.Boolean(readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self._cr, self._table)
+        columns = ", ".join('"{}"'.format(name) for name in HISTORY_COLUMNS)
+        self._cr.execute(
+            "CREATE OR REPLACE VIEW {table} AS ("
+            " SELECT id, {columns}, FALSE AS archived FROM queue_job"
+            " UNION ALL"
+            " SELECT job_id AS id, {columns}, TRUE AS archived"
+            " FROM queue_job_archive WHERE job_id IS NOT NULL"
+            ")".format(table=self._table, columns=columns)
+        )
+
+    def open_job(self):
+        """Open the job, or the archived job"""
+        self.ensure_one()
+        if self.archived:
+            record = self.env["queue.job.archive"].search(
+                [("job_id", "=", self.id)], limit=1
+            )
+        else:
+            record = self.env["queue.job"].browse(self.id)
+        return {
+            "name": _("Job"),
+            "type": "ir.actions.act_window",
+            "res_model": record._name,
+            "view_mode": "form",
+            "res_id": record.id,
+        }
@@ -6,28 +6,124 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def post_init_hook(cr, registry):
-    # this is the trigger that sends notifications when jobs change
-    logger.info("Create queue_job_notify trigger")
+def create_notify_triggers(cr):
+    """Create the triggers sending notifications to the job runner
+
+    The runner only needs to know about the changes which can modify the
+    scheduling of a job: new jobs, and the updates of ``state``,
+    ``priority``, ``eta`` or ``channel``. A job going from enqueued to
+    started is still running for the runner, so it is not notified. The
+    inserts and deletes are notified by statement-level triggers reading
+    the transition tables, so bulk inserts and deletes run a single
+    trigger. Deleted jobs which were done do not need to be notified.
+
+    The payload of the notifications is a json array of the columns read by
+    the runner (see ``_parse_notification`` in the runner), so it does not
+    need to read the job back. It is only the uuid of the job when the job
+    is deleted, or when the columns do not fit in a notification. The last
+    element of the arrays is a number taken from a sequence: PostgreSQL
+    drops a notification identical to one already sent in the same
+    transaction, so a job going from A to B then back to A would otherwise
+    end with the properties of B for the runner.
+    """
     cr.execute(
         """
+            CREATE SEQUENCE IF NOT EXISTS queue_job_notify_seq;
             DROP TRIGGER IF EXISTS queue_job_notify ON queue_job;
+            DROP TRIGGER IF EXISTS queue_job_notify_insert ON queue_job;
+            DROP TRIGGER IF EXISTS queue_job_notify_delete ON queue_job;
             CREATE OR REPLACE
                 FUNCTION queue_job_notify() RETURNS trigger AS $$
+            DECLARE
+                seq bigint;
+                payload text;
             BEGIN
-                IF TG_OP = 'DELETE' THEN
-                    IF OLD.state != 'done' THEN
-                        PERFORM pg_notify('queue_job', OLD.uuid);
-                    END IF;
-                ELSE
-                    PERFORM pg_notify('queue_job', NEW.uuid);
+                seq := nextval('queue_job_notify_seq');
+                payload := json_build_array(
+                    NEW.channel,
+                    NEW.uuid,
+                    NEW.id,
+                    EXTRACT(EPOCH FROM NEW.date_created)::float8,
+                    NEW.priority,
+                    EXTRACT(EPOCH FROM NEW.eta)::float8,
+                    NEW.state,
+                    seq
+                )::text;
+                IF octet_length(payload) >= 8000 THEN
+                    payload := json_build_array(NEW.uuid, seq)::text;
                 END IF;
+                PERFORM pg_notify('queue_job', payload);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            CREATE OR REPLACE
+                FUNCTION queue_job_notify_insert() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify(
+                    'queue_job',
+                    CASE WHEN octet_length(payload) < 8000
+                        THEN payload
+                        ELSE json_build_array(uuid, seq)::text END
+                )
+                FROM (
+                    SELECT uuid, seq, json_build_array(
+                        channel,
+                        uuid,
+                        id,
+                        EXTRACT(EPOCH FROM date_created)::float8,
+                        priority,
+                        EXTRACT(EPOCH FROM eta)::float8,
+                        state,
+                        seq
+                    )::text AS payload
+                    FROM (
+                        SELECT *, nextval('queue_job_notify_seq') AS seq
+                        FROM new_jobs
+                    ) AS jobs
+                ) AS payloads;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            CREATE OR REPLACE
+                FUNCTION queue_job_notify_delete() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify(
+                    'queue_job',
+                    json_build_array(uuid, nextval('queue_job_notify_seq'))::text
+                )
+                FROM old_jobs WHERE state != 'done';
                 RETURN NULL;
             END;
             $$ LANGUAGE plpgsql;
             CREATE TRIGGER queue_job_notify
-                AFTER INSERT OR UPDATE OR DELETE
+                AFTER UPDATE OF state, priority, eta, channel
+                ON queue_job
+                FOR EACH ROW
+                WHEN (
+                    (
+                        OLD.state IS DISTINCT FROM NEW.state
+                        AND NOT (OLD.state = 'enqueued' AND NEW.state = 'started')
+                    )
+                    OR OLD.priority IS DISTINCT FROM NEW.priority
+                    OR OLD.eta IS DISTINCT FROM NEW.eta
+                    OR OLD.channel IS DISTINCT FROM NEW.channel
+                )
+                EXECUTE PROCEDURE queue_job_notify();
+            CREATE TRIGGER queue_job_notify_insert
+                AFTER INSERT
                 ON queue_job
-                FOR EACH ROW EXECUTE PROCEDURE queue_job_notify();
+                REFERENCING NEW TABLE AS new_jobs
+                FOR EACH STATEMENT EXECUTE PROCEDURE queue_job_notify_insert();
+            CREATE TRIGGER queue_job_notify_delete
+                AFTER DELETE
+                ON queue_job
+                REFERENCING OLD TABLE AS old_jobs
+                FOR EACH STATEMENT EXECUTE PROCEDURE queue_job_notify_delete();
         """
     )
+
+
+def post_init_hook(cr, registry):
+    # these are the triggers that send notifications when jobs change
+    logger.info("Create queue_job_notify triggers")
+    create_notify_triggers(cr)
@@ -4,5 +4,7 @@ from . import test_delayable
 from . import test_json_field
 from . import test_model_job_channel
 from . import test_model_job_function
+from . import test_notify_trigger
 from . import test_queue_job_protected_write
 from . import test_wizards
+from . import test_benchmark_channels
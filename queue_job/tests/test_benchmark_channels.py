@@ -0,0 +1,73 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import gc
+import logging
+import random
+import time
+import tracemalloc
+
+from odoo.tests import common, tagged
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.jobrunner import channels
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged("-standard", "queue_job_benchmark")
+class TestChannelsBenchmark(common.BaseCase):
+    """Memory and throughput of the channel queues, not run by default
+
+    Run with ``--test-tags queue_job_benchmark``, the results are logged.
+    """
+
+    def _benchmark(self, size):
+        rnd = random.Random(size)
+        now = 1700000000.0
+        gc.collect()
+        tracemalloc.start()
+        queue = channels.ChannelQueue()
+        jobs = [
+            channels.ChannelJob(
+                "db",
+                None,
+                "uuid%d" % i,
+                i,
+                now + i,
+                rnd.choice((5, 10)),
+                # a tenth of the jobs have an eta
+                now + rnd.randint(0, 1000) if not i % 10 else None,
+            )
+            for i in range(size)
+        ]
+        start = time.perf_counter()
+        for job in jobs:
+            queue.add(job)
+        add_time = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        removed = jobs[::3]
+        start = time.perf_counter()
+        for job in removed:
+            queue.remove(job)
+        remove_time = time.perf_counter() - start
+        popped = 0
+        start = time.perf_counter()
+        while queue.pop(now + 2000) is not None:
+            popped += 1
+        pop_time = time.perf_counter() - start
+        self.assertEqual(popped, size - len(removed))
+        _logger.info(
+            "%d jobs: %d bytes/job, add %.0f ops/s, remove %.0f ops/s, "
+            "pop %.0f ops/s",
+            size,
+            memory / size,
+            size / add_time,
+            len(removed) / remove_time,
+            popped / pop_time,
+        )
+
+    def test_channel_queue(self):
+        for size in (10**5, 10**6):
+            self._benchmark(size)
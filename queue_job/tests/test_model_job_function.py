@@ -53,5 +53,8 @@ class TestJobFunction(common.TransactionCase):
                 related_action_func_name="related_action_foo",
                 related_action_kwargs={"b": 1},
                 job_function_id=job_function.id,
+                coalesce_limit=0,
+                debounce_window=0,
+                debounce_max_delay=0,
             ),
         )
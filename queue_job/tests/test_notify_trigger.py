@@ -0,0 +1,149 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import select
+import uuid
+
+from odoo import sql_db
+from odoo.tests import common
+
+from odoo.addons.queue_job.jobrunner.runner import _parse_notification
+
+
+class TestNotifyTrigger(common.TransactionCase):
+    """Check the notifications the job runner receives
+
+    The notifications are sent on commit, so the jobs are written and
+    committed with their own cursor, out of the test transaction.
+    """
+
+    def setUp(self):
+        super().setUp()
+        db = sql_db.db_connect(self.env.cr.dbname)
+        self.listener = db.cursor()
+        self.listener.execute("LISTEN queue_job")
+        self.listener.commit()
+        self.writer = db.cursor()
+        self.uuids = [str(uuid.uuid4()), str(uuid.uuid4())]
+        self.payloads = {}
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        self.writer.execute(
+            "DELETE FROM queue_job WHERE uuid IN %s", (tuple(self.uuids),)
+        )
+        self.writer.commit()
+        self.writer.close()
+        self.listener.close()
+
+    def _commit_notified(self, query, params=None):
+        """Commit the queries, return the uuids of the jobs notified
+
+        ``query`` is a query or a list of queries executed in the same
+        transaction. ``self.payloads`` holds the last properties notified
+        for each job.
+        """
+        queries = [query] if isinstance(query, str) else query
+        for query in queries:
+            self.writer.execute(query, params)
+        self.writer.commit()
+        # notifications are received in the order of the commits
+        sentinel = str(uuid.uuid4())
+        self.writer.execute("SELECT pg_notify('queue_job', %s)", (sentinel,))
+        self.writer.commit()
+        connection = self.listener._cnx
+        notified = set()
+        while True:
+            if not connection.notifies:
+                select.select([connection], [], [], 10)
+                connection.poll()
+                self.assertTrue(connection.notifies, "notification not received")
+            payload = connection.notifies.pop(0).payload
+            if payload == sentinel:
+                return notified
+            job_uuid, job_datas = _parse_notification(payload)
+            if job_uuid in self.uuids:
+                notified.add(job_uuid)
+                self.payloads[job_uuid] = job_datas
+
+    def test_notify_transitions(self):
+        job1, job2 = self.uuids
+        notified = self._commit_notified(
+            "INSERT INTO queue_job (uuid, state, channel, priority, date_created) "
+            "VALUES (%s, 'pending', 'root', 10, now()), "
+            "(%s, 'pending', 'root', 10, now())",
+            (job1, job2),
+        )
+        self.assertEqual(notified, {job1, job2})
+        self._assert_payload(job1)
+        # columns which do not change the scheduling
+        notified = self._commit_notified(
+            "UPDATE queue_job SET result = 'ok', worker_pid = 1, exc_info = 'x' "
+            "WHERE uuid = %s",
+            (job1,),
+        )
+        self.assertEqual(notified, set())
+        notified = self._commit_notified(
+            "UPDATE queue_job SET state = state WHERE uuid = %s", (job1,)
+        )
+        self.assertEqual(notified, set())
+        notified = self._commit_notified(
+            "UPDATE queue_job SET state = 'enqueued' WHERE uuid = %s", (job1,)
+        )
+        self.assertEqual(notified, {job1})
+        # still running for the runner
+        notified = self._commit_notified(
+            "UPDATE queue_job SET state = 'started' WHERE uuid = %s", (job1,)
+        )
+        self.assertEqual(notified, set())
+        notified = self._commit_notified(
+            "UPDATE queue_job SET state = 'done' WHERE uuid = %s", (job1,)
+        )
+        self.assertEqual(notified, {job1})
+        for values in (
+            "priority = 5",
+            "eta = now() + interval '1 hour'",
+            "channel = 'root.test'",
+        ):
+            notified = self._commit_notified(
+                "UPDATE queue_job SET {} WHERE uuid = %s".format(values), (job2,)
+            )
+            self.assertEqual(notified, {job2})
+            self._assert_payload(job2)
+        # the done jobs are already released by the runner
+        notified = self._commit_notified(
+            "DELETE FROM queue_job WHERE uuid IN %s", (tuple(self.uuids),)
+        )
+        self.assertEqual(notified, {job2})
+        # deleted jobs are read back by the runner
+        self.assertIsNone(self.payloads[job2])
+
+    def test_notify_same_payload(self):
+        job1 = self.uuids[0]
+        self._commit_notified(
+            "INSERT INTO queue_job (uuid, state, channel, priority, date_created) "
+            "VALUES (%s, 'pending', 'root', 10, now())",
+            (job1,),
+        )
+        # the first and last notifications have the same properties, the
+        # last one must not be dropped by PostgreSQL
+        notified = self._commit_notified(
+            [
+                "UPDATE queue_job SET priority = 5 WHERE uuid = %s",
+                "UPDATE queue_job SET priority = 10 WHERE uuid = %s",
+                "UPDATE queue_job SET priority = 5 WHERE uuid = %s",
+            ],
+            (job1,),
+        )
+        self.assertEqual(notified, {job1})
+        self.assertEqual(self.payloads[job1][4], 5)
+        self._assert_payload(job1)
+
+    def _assert_payload(self, job_uuid):
+        """The payload has the same values as the runner reads"""
+        self.writer.execute(
+            "SELECT channel, uuid, id, EXTRACT(EPOCH FROM date_created)::float8, "
+            "priority, EXTRACT(EPOCH FROM eta)::float8, state "
+            "FROM queue_job WHERE uuid = %s",
+            (job_uuid,),
+        )
+        self.assertEqual(self.payloads[job_uuid], self.writer.fetchone())
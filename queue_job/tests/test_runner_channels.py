@@ -1,6 +1,11 @@
 # Copyright 2015-2016 Camptocamp SA
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 
+import random
+from unittest import mock
+
+from odoo.tests import common
+
 # pylint: disable=odoo-addons-relative-import
 # we are testing, we want to test as we were an external consumer of the API
 from odoo.addons.queue_job.jobrunner import channels
@@ -8,3 +13,116 @@ from odoo.addons.queue_job.jobrunner import channels
 from .common import load_doctests
 
 load_tests = load_doctests(channels)
+
+
+class BaselineChannel(channels.Channel):
+    """Channel evaluating all its children on every call
+
+    Neither the jobs to run nor the wakeup times are cached.
+    """
+
+    def _needs_run(self, now):
+        return True
+
+    def get_wakeup_time(self, wakeup_time=0):
+        return self._compute_wakeup_time(wakeup_time)
+
+
+class TestChannelsBaseline(common.BaseCase):
+    """The channels skipping idle children behave as the baseline"""
+
+    config = (
+        "root:4,root.A:2,root.A.X:1,root.A.Y:1:throttle=3,"
+        "root.B:1:sequential,root.B.C:2,root.D:3:throttle=2,root.D.E"
+    )
+    channel_names = (
+        "root",
+        "root.A",
+        "root.A.X",
+        "root.A.Y",
+        "root.B",
+        "root.B.C",
+        "root.D",
+        "root.D.E",
+        "root.D.not.configured",
+    )
+
+    def setUp(self):
+        super().setUp()
+        self._reset()
+
+    def _reset(self):
+        self.manager = channels.ChannelManager()
+        self.manager.simple_configure(self.config)
+        with self._baseline():
+            self.baseline = channels.ChannelManager()
+            self.baseline.simple_configure(self.config)
+        self.jobs = {}
+
+    def _baseline(self):
+        # channels created by the baseline manager are baseline channels
+        return mock.patch.object(channels, "Channel", BaselineChannel)
+
+    def _notify(self, uuid, state):
+        channel, seq, date_created, priority, eta = self.jobs[uuid]
+        args = ("db", channel, uuid, seq, date_created, priority, eta, state)
+        self.manager.notify(*args)
+        with self._baseline():
+            self.baseline.notify(*args)
+
+    def _run(self, now):
+        jobs = [job.uuid for job in self.manager.get_jobs_to_run(now)]
+        with self._baseline():
+            baseline_jobs = [job.uuid for job in self.baseline.get_jobs_to_run(now)]
+        self.assertEqual(jobs, baseline_jobs)
+        self.assertEqual(
+            self.manager.get_wakeup_time(), self.baseline.get_wakeup_time()
+        )
+        for uuid in jobs:
+            self._notify(uuid, "enqueued")
+
+    def _random_step(self, rnd, now):
+        action = rnd.random()
+        # the done jobs are dropped by the manager
+        known = list(self.manager._jobs_by_uuid)
+        if action < 0.3 or not known:
+            uuid = "job%d" % len(self.jobs)
+            self.jobs[uuid] = (
+                rnd.choice(self.channel_names),
+                len(self.jobs),
+                now,
+                rnd.choice((5, 10)),
+                rnd.choice((None, now + rnd.randint(0, 10))),
+            )
+            self._notify(uuid, "pending")
+        elif action < 0.5:
+            state = rnd.choice(("pending", "started", "done", "failed", "cancelled"))
+            self._notify(rnd.choice(known), state)
+        else:
+            self._run(now)
+
+    def test_random_sequences(self):
+        for seed in range(300):
+            rnd = random.Random(seed)
+            self._reset()
+            now = 1000
+            for __ in range(100):
+                now += rnd.choice((0, 0.5, 1, 2))
+                self._random_step(rnd, now)
+            self._run(now)
+
+    def test_full_parent_child_eta(self):
+        # the eta of Y1 is reached while root.A is full: Y1 is moved up to
+        # root.A and takes the capacity of root.A.Y
+        now = 1000
+        self.jobs["A1"] = ("root.A", 1, now, 10, None)
+        self.jobs["A2"] = ("root.A", 2, now, 10, None)
+        self.jobs["Y1"] = ("root.A.Y", 3, now, 10, now + 5)
+        for uuid in ("A1", "A2", "Y1"):
+            self._notify(uuid, "pending")
+        self._run(now)
+        self._run(now + 10)
+        self.jobs["Y2"] = ("root.A.Y", 4, now + 10, 5, None)
+        self._notify("Y2", "pending")
+        self._notify("A1", "done")
+        self._run(now + 11)
@@ -1 +1 @@
-from . import queue_job, queue_job_batch
+from . import queue_job, queue_job_archive, queue_job_batch
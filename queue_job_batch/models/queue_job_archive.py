@@ -0,0 +1,13 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+from odoo import api, fields, models
+
+
+class QueueJobArchive(models.Model):
+    _inherit = "queue.job.archive"
+
+    job_batch_id = fields.Many2one("queue.job.batch", readonly=True, index=True)
+
+    @api.model
+    def _archive_columns(self):
+        return super()._archive_columns() + ["job_batch_id"]
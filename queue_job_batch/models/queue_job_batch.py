@@ -21,9 +21,17 @@ class QueueJobBatch(models.Model):
         inverse_name="job_batch_id",
         readonly=True,
     )
+    archived_job_ids = fields.One2many(
+        "queue.job.archive",
+        inverse_name="job_batch_id",
+        readonly=True,
+    )
     job_count = fields.Integer(
         compute="_compute_job_count",
     )
+    archived_job_count = fields.Integer(
+        compute="_compute_job_count",
+    )
     user_id = fields.Many2one(
         "res.users",
         required=True,
@@ -65,15 +73,21 @@ class QueueJobBatch(models.Model):
         for record in self:
             record.check_state()
 
+    def _get_job_states(self):
+        """Return the states of the jobs of the batch, archived ones included"""
+        self.ensure_one()
+        return self.job_ids.mapped("state") + self.archived_job_ids.mapped("state")
+
     def check_state(self):
         self.ensure_one()
+        job_states = self._get_job_states()
         if self.state == "enqueued" and any(
-            job.state not in ["pending", "enqueued"] for job in self.job_ids
+            state not in ["pending", "enqueued"] for state in job_states
         ):
             self.write({"state": "progress"})
         if self.state != "progress":
             return True
-        if all(job.state == "done" for job in self.job_ids):
+        if all(state == "done" for state in job_states):
             self.write(
                 {
                     "state": "finished",
@@ -108,15 +122,15 @@ class QueueJobBatch(models.Model):
         )
         return self.sudo().create(vals).with_user(self.env.uid)
 
-    @api.depends("job_ids")
+    @api.depends("job_ids", "archived_job_ids")
     def _compute_job_count(self):
         for record in self:
-            job_count = len(record.job_ids)
-            failed_job_count = len(
-                record.job_ids.filtered(lambda r: r.state == "failed")
-            )
-            done_job_count = len(record.job_ids.filtered(lambda r: r.state == "done"))
+            job_states = record._get_job_states()
+            job_count = len(job_states)
+            failed_job_count = job_states.count("failed")
+            done_job_count = job_states.count("done")
             record.job_count = job_count
+            record.archived_job_count = len(record.archived_job_ids)
             record.finished_job_count = done_job_count
             record.failed_job_count = failed_job_count
             record.completeness = done_job_count / max(1, job_count)
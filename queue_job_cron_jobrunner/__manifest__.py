@@ -1,7 +1,7 @@
 {
     "name": "Queue Job Cron Jobrunner",
     "summary": "Run jobs without a dedicated JobRunner",
-    "version": "16.0.1.0.0",
+    "version": "16.0.1.1.0",
     "development_status": "Alpha",
     "author": "Camptocamp SA, Odoo Community Association (OCA)",
     "maintainers": ["ivantodorovich"],
@@ -12,6 +12,7 @@
     "data": [
         "data/ir_cron.xml",
         "views/ir_cron.xml",
+        "views/queue_job_channel.xml",
     ],
     "installable": True,
 }
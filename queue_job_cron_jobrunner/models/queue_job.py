@@ -3,13 +3,17 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
 import logging
+import math
+import time
 import traceback
+from datetime import datetime, timedelta
 from io import StringIO
 
 from psycopg2 import OperationalError
 
-from odoo import _, api, models, tools
+from odoo import _, api, fields, models, tools
 from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+from odoo.tools import config
 
 from odoo.addons.queue_job.controllers.main import PG_RETRY
 from odoo.addons.queue_job.exception import (
@@ -21,18 +25,33 @@ from odoo.addons.queue_job.job import Job
 
 _logger = logging.getLogger(__name__)
 
+# number of jobs fetched by each claim query
+ACQUIRE_BATCH_SIZE = 10
+# stop processing jobs after this ratio of limit_time_real_cron
+TIME_LIMIT_RATIO = 0.8
+# etas of delayed jobs are rounded up to a multiple of this number of
+# seconds, so the jobs with close etas share the same cron triggers
+TRIGGER_ETA_ROUNDING = 60
+
+
+class ChannelFull(Exception):
+    """No capacity left in the channel of a job"""
+
 
 class QueueJob(models.Model):
     _inherit = "queue.job"
 
     @api.model
-    def _acquire_one_job(self):
-        """Acquire the next job to be run.
+    def _acquire_jobs(self, limit=ACQUIRE_BATCH_SIZE, exclude_ids=()):
+        """Acquire the next jobs to be run.
 
-        :returns: queue.job record (locked for update)
+        Jobs are ordered by priority, then eta and id.
+
+        :param limit: maximum number of jobs to acquire
+        :param exclude_ids: ids of jobs to ignore, such as jobs of channels
+                            without capacity left
+        :returns: queue.job records (locked for update)
         """
-        # TODO: This method should respect channel priority and capacity,
-        #       rather than just fetching them by creation date.
         self.env.flush_all()
         self.env.cr.execute(
             """
@@ -40,12 +59,88 @@ class QueueJob(models.Model):
             FROM queue_job
             WHERE state = 'pending'
             AND (eta IS NULL OR eta <= (now() AT TIME ZONE 'UTC'))
-            ORDER BY date_created DESC
-            LIMIT 1 FOR NO KEY UPDATE SKIP LOCKED
+            AND id != ALL(%s)
+            ORDER BY priority, eta, id
+            LIMIT %s FOR NO KEY UPDATE SKIP LOCKED
+            """,
+            (list(exclude_ids), limit),
+        )
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _acquire_one_job(self):
+        """Acquire the next job to be run.
+
+        :returns: queue.job record (locked for update)
+        """
+        return self._acquire_jobs(limit=1)
+
+    def _lock_pending(self):
+        """Lock the job if it is still pending and not locked by another runner
+
+        The locks taken by ``_acquire_jobs`` are released by the commit
+        done after each job, so the next jobs must be locked again.
+
+        :returns: True if the job is locked
+        """
+        self.ensure_one()
+        self.env.cr.execute(
             """
+            SELECT id
+            FROM queue_job
+            WHERE id = %s
+            AND state = 'pending'
+            AND (eta IS NULL OR eta <= (now() AT TIME ZONE 'UTC'))
+            FOR NO KEY UPDATE SKIP LOCKED
+            """,
+            (self.id,),
         )
-        row = self.env.cr.fetchone()
-        return self.browse(row and row[0])
+        if not self.env.cr.fetchone():
+            return False
+        self.invalidate_recordset()
+        return True
+
+    @api.model
+    def _get_channel_capacities(self):
+        """Return the capacity of the channels having one, by complete name"""
+        channels = self.env["queue.job.channel"].sudo().search([("capacity", ">", 0)])
+        return {channel.complete_name: channel.capacity for channel in channels}
+
+    def _acquire_channel_slots(self, capacities):
+        """Take a slot in the channel of the job and in its parent channels
+
+        A slot is a transaction level advisory lock, released by the commit
+        done after the job, so each cron runner can take one of the
+        ``capacity`` slots of a channel. The slots taken are released if one
+        of the channels is full.
+
+        :param capacities: capacity of channels, by complete name
+        :returns: True if the job can run without exceeding any capacity
+        """
+        self.ensure_one()
+        parts = (self.channel or "root").split(".")
+        names = [".".join(parts[:i]) for i in range(len(parts), 0, -1)]
+        names = [name for name in names if capacities.get(name)]
+        if not names:
+            return True
+        try:
+            with self.env.cr.savepoint(flush=False):
+                for name in names:
+                    for slot in range(capacities[name]):
+                        self.env.cr.execute(
+                            "SELECT pg_try_advisory_xact_lock("
+                            "hashtextextended(%s, 0))",
+                            ("queue_job_channel:%s:%s" % (name, slot),),
+                        )
+                        if self.env.cr.fetchone()[0]:
+                            break
+                    else:
+                        # rolling back the savepoint releases the slots
+                        raise ChannelFull(name)
+        except ChannelFull as err:
+            _logger.debug("no capacity left in channel %s for job %s", err, self.uuid)
+            return False
+        return True
 
     def _process(self, commit=False):
         """Process the job"""
@@ -109,21 +204,52 @@ class QueueJob(models.Model):
         job.enqueue_waiting()
         _logger.debug("%s enqueue depends done", job)
 
+    @api.model
+    def _job_runner_time_limit(self):
+        """Time in seconds after which the cron worker could be killed"""
+        limit = config["limit_time_real_cron"]
+        if limit is None or limit < 0:
+            # same default as the CronWorker of odoo
+            limit = config["limit_time_real"]
+        if not config["workers"]:
+            # only the cron workers of the multi-process server are limited
+            return 0
+        return limit
+
     @api.model
     def _job_runner(self, commit=True):
-        """Short-lived job runner, triggered by async crons"""
-        job = self._acquire_one_job()
-        while job:
-            job._process(commit=commit)
-            job = self._acquire_one_job()
-            # TODO: If limit_time_real_cron is reached before all the jobs are done,
-            #       the worker will be killed abruptly.
-            #       Ideally, find a way to know if we're close to reaching this limit,
-            #       stop processing, and trigger a new execution to continue.
-            #
-            # if job and limit_time_real_cron_reached_or_about_to_reach:
-            #     self._cron_trigger()
-            #     break
+        """Short-lived job runner, triggered by async crons
+
+        Jobs are acquired by batches, in the order of their priority, and
+        run as long as their channels have capacity left. When the time
+        limit of the cron worker is close, the runner stops and triggers
+        the crons again to process the remaining jobs.
+        """
+        time_limit = self._job_runner_time_limit()
+        deadline = time.time() + time_limit * TIME_LIMIT_RATIO if time_limit else 0
+        capacities = self._get_channel_capacities()
+        longest_duration = 0
+        skipped_ids = set()
+        while True:
+            jobs = self._acquire_jobs(exclude_ids=skipped_ids)
+            if not jobs:
+                break
+            for job in jobs:
+                if deadline and time.time() + longest_duration >= deadline:
+                    _logger.info(
+                        "queue job cron runner stops before its time limit, "
+                        "remaining jobs are processed by the next run"
+                    )
+                    self._cron_trigger()
+                    return
+                if not job._lock_pending():
+                    continue
+                if not job._acquire_channel_slots(capacities):
+                    skipped_ids.add(job.id)
+                    continue
+                started_at = time.time()
+                job._process(commit=commit)
+                longest_duration = max(longest_duration, time.time() - started_at)
 
     @api.model
     def _cron_trigger(self, at=None):
@@ -139,19 +265,47 @@ class QueueJob(models.Model):
         for cron in crons:
             cron._trigger(at=at)
 
+    @api.model
+    def _round_trigger_eta(self, eta):
+        """Round up an eta to the next multiple of TRIGGER_ETA_ROUNDING"""
+        epoch = datetime(1970, 1, 1)
+        seconds = (eta - epoch).total_seconds()
+        rounded = math.ceil(seconds / TRIGGER_ETA_ROUNDING) * TRIGGER_ETA_ROUNDING
+        return epoch + timedelta(seconds=rounded)
+
     def _ensure_cron_trigger(self):
-        """Create cron triggers for these jobs"""
+        """Create cron triggers for these jobs
+
+        The triggers are collected during the transaction and created once,
+        before the commit, so enqueuing many jobs creates one trigger per
+        cron for the immediate jobs, and one per cron and rounded eta for
+        the delayed jobs.
+        """
         records = self.filtered(lambda r: r.state == "pending")
         if not records:
             return
+        precommit = self.env.cr.precommit
+        if "queue_job_cron_trigger_at" not in precommit.data:
+            precommit.data["queue_job_cron_trigger_at"] = set()
+            precommit.add(self._flush_cron_triggers)
+        trigger_at = precommit.data["queue_job_cron_trigger_at"]
+        for record in records:
+            # None triggers an immediate run
+            trigger_at.add(record.eta and self._round_trigger_eta(record.eta))
+
+    def _flush_cron_triggers(self):
+        trigger_at = self.env.cr.precommit.data.pop("queue_job_cron_trigger_at", ())
+        if not trigger_at:
+            return
+        now = fields.Datetime.now()
         # Trigger immediate runs
-        immediate = any(not rec.eta for rec in records)
-        if immediate:
+        if any(not at or at <= now for at in trigger_at):
             self._cron_trigger()
         # Trigger delayed eta runs
-        delayed_etas = {rec.eta for rec in records if rec.eta}
+        delayed_etas = sorted(at for at in trigger_at if at and at > now)
         if delayed_etas:
-            self._cron_trigger(at=list(delayed_etas))
+            self._cron_trigger(at=delayed_etas)
+        self.env.flush_all()
 
     @api.model_create_multi
     def create(self, vals_list):
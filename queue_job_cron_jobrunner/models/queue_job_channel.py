@@ -0,0 +1,21 @@
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import fields, models
+
+
+class QueueJobChannel(models.Model):
+    _inherit = "queue.job.channel"
+
+    capacity = fields.Integer(
+        help="Maximum number of jobs of this channel and its subchannels "
+        "processed at the same time by the queue job runner crons. "
+        "0 means no limit.",
+    )
+
+    _sql_constraints = [
+        (
+            "capacity_positive",
+            "CHECK(capacity >= 0)",
+            "The capacity of a channel cannot be negative.",
+        )
+    ]
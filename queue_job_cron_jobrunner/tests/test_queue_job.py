@@ -3,13 +3,16 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
 from datetime import timedelta
+from unittest import mock
 
 from freezegun import freeze_time
 
-from odoo import fields
+from odoo import fields, sql_db
 from odoo.tests.common import TransactionCase
 from odoo.tools import mute_logger
 
+from odoo.addons.queue_job_cron_jobrunner.models import queue_job as queue_job_module
+
 
 class TestQueueJob(TransactionCase):
     @classmethod
@@ -32,9 +35,33 @@ class TestQueueJob(TransactionCase):
         """Test that ir.cron triggers are created for every queue.job"""
         job = self.env["res.partner"].with_delay().create({"name": "test"})
         job_record = job.db_record()
+        self.env.cr.precommit.run()
         self.assertTriggerAt(fields.Datetime.now(), "Trigger should've been created")
         job_record.eta = fields.Datetime.now() + timedelta(hours=1)
-        self.assertTriggerAt(job_record.eta, "A new trigger should've been created")
+        self.env.cr.precommit.run()
+        self.assertTriggerAt(
+            fields.Datetime.to_datetime("2022-02-22 23:23:00"),
+            "A new trigger should've been created, at the rounded eta",
+        )
+
+    @freeze_time("2022-02-22 22:22:22")
+    def test_queue_job_cron_trigger_coalesced(self):
+        """Triggers are created once per transaction and per rounded eta"""
+        crons = self.env["ir.cron"].search([("queue_job_runner", "=", True)])
+        triggers = self.env["ir.cron.trigger"]
+        for size in (10, 100):
+            triggers.search([]).unlink()
+            for i in range(size):
+                self.env["res.partner"].with_delay().create({"name": "test"})
+                # delayed jobs with etas spread over 9 minutes
+                self.env["res.partner"].with_delay(eta=i % 10 * 60).create(
+                    {"name": "test"}
+                )
+            self.assertFalse(triggers.search([]), "Triggers are created on commit")
+            self.env.cr.precommit.run()
+            # one immediate trigger and one per rounded eta, for each cron,
+            # whatever the number of jobs
+            self.assertEqual(triggers.search_count([]), len(crons) * 10)
 
     @mute_logger("odoo.addons.queue_job_cron_jobrunner.models.queue_job")
     def test_queue_job_process(self):
@@ -69,3 +96,60 @@ class TestQueueJob(TransactionCase):
         # if the state is "waiting_dependencies", it means the "enqueue_waiting()"
         # step has not been doen when the parent job has been done
         self.assertEqual(job_record_depends.state, "done", "Processed OK")
+
+    def test_acquire_jobs_order(self):
+        """Jobs are acquired by priority, then eta and id"""
+        job1 = self.env["res.partner"].with_delay(priority=20).create({"name": "1"})
+        job2 = self.env["res.partner"].with_delay(priority=5).create({"name": "2"})
+        job3 = self.env["res.partner"].with_delay(priority=5).create({"name": "3"})
+        job4 = self.env["res.partner"].with_delay(priority=10).create({"name": "4"})
+        records = self.env["queue.job"]._acquire_jobs(limit=3)
+        self.assertEqual(
+            records, job2.db_record() | job3.db_record() | job4.db_record()
+        )
+        self.assertEqual([r.uuid for r in records], [job2.uuid, job3.uuid, job4.uuid])
+        records = self.env["queue.job"]._acquire_jobs(exclude_ids=records.ids)
+        self.assertEqual(records, job1.db_record())
+
+    def test_channel_capacity(self):
+        """A job is not run when the slots of its channel are taken"""
+        channel = self.env["queue.job.channel"].create(
+            {
+                "name": "cron_capacity",
+                "parent_id": self.env.ref("queue_job.channel_root").id,
+                "capacity": 1,
+            }
+        )
+        job = (
+            self.env["res.partner"]
+            .with_delay(channel="root.cron_capacity")
+            .create({"name": "test"})
+        )
+        job_record = job.db_record()
+        capacities = self.env["queue.job"]._get_channel_capacities()
+        self.assertEqual(capacities[channel.complete_name], 1)
+        # another cron runner holds the only slot of the channel
+        with sql_db.db_connect(self.env.cr.dbname).cursor() as other_cr:
+            other_cr.execute(
+                "SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))",
+                ("queue_job_channel:root.cron_capacity:0",),
+            )
+            self.assertFalse(job_record._acquire_channel_slots(capacities))
+            self.env["queue.job"]._job_runner(commit=False)
+            self.assertEqual(job_record.state, "pending")
+        self.assertTrue(job_record._acquire_channel_slots(capacities))
+        self.env["queue.job"]._job_runner(commit=False)
+        self.assertEqual(job_record.state, "done")
+
+    def test_job_runner_time_limit(self):
+        """The runner stops and triggers the crons before its time limit"""
+        job = self.env["res.partner"].with_delay().create({"name": "test"})
+        job_record = job.db_record()
+        self.env["ir.cron.trigger"].search([]).unlink()
+        queue_job = self.env["queue.job"]
+        with mock.patch.object(
+            type(queue_job), "_job_runner_time_limit", return_value=60
+        ), mock.patch.object(queue_job_module, "TIME_LIMIT_RATIO", 0):
+            queue_job._job_runner(commit=False)
+        self.assertEqual(job_record.state, "pending")
+        self.assertTrue(self.env["ir.cron.trigger"].search([]))
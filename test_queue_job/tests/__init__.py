@@ -1,3 +1,4 @@
+from . import test_archive
 from . import test_autovacuum
 from . import test_delayable
 from . import test_dependencies
@@ -6,3 +7,4 @@ from . import test_job_auto_delay
 from . import test_job_channels
 from . import test_related_actions
 from . import test_delay_mocks
+from . import test_benchmark
@@ -0,0 +1,95 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from datetime import datetime, timedelta
+
+from odoo.addons.queue_job.delay import DelayableGraph
+from odoo.addons.queue_job.job import Job
+
+from .common import JobCommonCase
+
+
+class TestQueueJobArchive(JobCommonCase):
+    def test_archive_jobs(self):
+        date_done = datetime.now() - timedelta(hours=2)
+        job_done = self._create_job()
+        job_done.write({"state": "done", "date_done": date_done, "result": "ok"})
+        message = job_done.message_post(body="done")
+        uuid = job_done.uuid
+        job_id = job_done.id
+        job_recent = self._create_job()
+        job_recent.write({"state": "done", "date_done": datetime.now()})
+        job_pending = self._create_job()
+
+        self.env["queue.job.archive"].archive_jobs()
+        self.assertFalse(job_done.exists())
+        # kept until the archived job is deleted
+        self.assertTrue(message.exists())
+        self.assertTrue(job_recent.exists())
+        self.assertTrue(job_pending.exists())
+        archived = self.env["queue.job.archive"].search([("uuid", "=", uuid)])
+        self.assertEqual(len(archived), 1)
+        self.assertEqual(archived.state, "done")
+        self.assertEqual(archived.result, "ok")
+        self.assertEqual(archived.method_name, "testing_method")
+        self.assertTrue(archived.date_archived)
+        self.assertEqual(archived.job_id, job_id)
+
+    def test_autovacuum_archive(self):
+        date_done = datetime.now() - timedelta(days=31)
+        job_done = self._create_job()
+        job_done.write({"state": "done", "date_done": date_done})
+        message = job_done.message_post(body="done")
+        uuid = job_done.uuid
+        self.env["queue.job.archive"].archive_jobs()
+        archive_model = self.env["queue.job.archive"]
+        self.assertEqual(archive_model.search_count([("uuid", "=", uuid)]), 1)
+        self.env["queue.job"].autovacuum()
+        self.assertEqual(archive_model.search_count([("uuid", "=", uuid)]), 0)
+        self.assertFalse(message.exists())
+
+    def test_history(self):
+        date_done = datetime.now() - timedelta(hours=2)
+        job_done = self._create_job()
+        job_done.write({"state": "done", "date_done": date_done})
+        job_id = job_done.id
+        job_pending = self._create_job()
+        self.env["queue.job.archive"].archive_jobs()
+
+        history = self.env["queue.job.history"].search(
+            [("id", "in", (job_id, job_pending.id))]
+        )
+        self.assertEqual(len(history), 2)
+        archived = history.filtered("archived")
+        self.assertEqual(archived.id, job_id)
+        self.assertEqual(archived.state, "done")
+        self.assertEqual(archived.open_job()["res_model"], "queue.job.archive")
+        live = history - archived
+        self.assertEqual(live.uuid, job_pending.uuid)
+        self.assertEqual(live.open_job()["res_model"], "queue.job")
+
+    def test_dependency_graph_archived_parent(self):
+        job_root = Job(self.method)
+        job_child = Job(self.method)
+        job_child.add_depends({job_root})
+        DelayableGraph._ensure_same_graph_uuid([job_root, job_child])
+        job_root.store()
+        job_child.store()
+        record_root = job_root.db_record()
+        root_id = record_root.id
+        record_root.write(
+            {"state": "done", "date_done": datetime.now() - timedelta(hours=2)}
+        )
+        self.env["queue.job.archive"].archive_jobs()
+        self.assertFalse(record_root.exists())
+
+        record_child = job_child.db_record()
+        graph = record_child.dependency_graph
+        self.assertEqual(
+            sorted(node["id"] for node in graph["nodes"]),
+            sorted([root_id, record_child.id]),
+        )
+        self.assertEqual(
+            [list(edge) for edge in graph["edges"]], [[root_id, record_child.id]]
+        )
+        action = self.env["queue.job"].browse(root_id).get_formview_action()
+        self.assertEqual(action["res_model"], "queue.job.archive")
@@ -18,7 +18,7 @@ class TestQueueJobAutovacuumCronJob(JobCommonCase):
             days=self.queue_job._removal_interval + 1
         )
         stored = self._create_job()
-        stored.write({"date_done": date_done})
+        stored.write({"state": "done", "date_done": date_done})
         self.cron_job.method_direct_trigger()
         self.assertFalse(stored.exists())
 
@@ -26,12 +26,12 @@ class TestQueueJobAutovacuumCronJob(JobCommonCase):
         # test default removal interval
         stored = self._create_job()
         date_done = datetime.now() - timedelta(days=29)
-        stored.write({"date_done": date_done})
+        stored.write({"state": "done", "date_done": date_done})
         self.env["queue.job"].autovacuum()
         self.assertEqual(len(self.env["queue.job"].search([])), 1)
 
         date_done = datetime.now() - timedelta(days=31)
-        stored.write({"date_done": date_done})
+        stored.write({"state": "done", "date_done": date_done})
         self.env["queue.job"].autovacuum()
         self.assertEqual(len(self.env["queue.job"].search([])), 0)
 
@@ -42,10 +42,14 @@ class TestQueueJobAutovacuumCronJob(JobCommonCase):
         )
         date_done = datetime.now() - timedelta(days=31)
         job_root = self._create_job()
-        job_root.write({"date_done": date_done})
+        job_root.write({"state": "done", "date_done": date_done})
         job_60days = self._create_job()
         job_60days.write(
-            {"channel": channel_60days.complete_name, "date_done": date_done}
+            {
+                "channel": channel_60days.complete_name,
+                "state": "done",
+                "date_done": date_done,
+            }
         )
 
         self.assertEqual(len(self.env["queue.job"].search([])), 2)
@@ -56,3 +60,44 @@ class TestQueueJobAutovacuumCronJob(JobCommonCase):
         job_60days.write({"date_done": date_done})
         self.env["queue.job"].autovacuum()
         self.assertEqual(len(self.env["queue.job"].search([])), 0)
+
+    def test_autovacuum_state(self):
+        date_cancelled = datetime.now() - timedelta(days=31)
+        job_cancelled = self._create_job()
+        job_cancelled.write({"state": "cancelled", "date_cancelled": date_cancelled})
+        message = job_cancelled.message_post(body="cancelled")
+        # only done and cancelled jobs are removed
+        job_pending = self._create_job()
+        job_pending.write({"date_done": date_cancelled})
+        self.env["queue.job"].autovacuum()
+        self.assertFalse(job_cancelled.exists())
+        self.assertFalse(message.exists())
+        self.assertTrue(job_pending.exists())
+
+    def test_autovacuum_unconfigured_channel(self):
+        root_channel = self.env.ref("queue_job.channel_root")
+        channel_60days = self.env["queue.job.channel"].create(
+            {"name": "60days", "removal_interval": 60, "parent_id": root_channel.id}
+        )
+        date_done = datetime.now() - timedelta(days=31)
+        # falls back on root
+        job_unknown = self._create_job()
+        job_unknown.write(
+            {"channel": "root.unknown", "state": "done", "date_done": date_done}
+        )
+        # falls back on root.60days
+        job_sub = self._create_job()
+        job_sub.write(
+            {
+                "channel": channel_60days.complete_name + ".sub",
+                "state": "done",
+                "date_done": date_done,
+            }
+        )
+        self.env["queue.job"].autovacuum()
+        self.assertFalse(job_unknown.exists())
+        self.assertTrue(job_sub.exists())
+
+        job_sub.write({"date_done": datetime.now() - timedelta(days=61)})
+        self.env["queue.job"].autovacuum()
+        self.assertFalse(job_sub.exists())
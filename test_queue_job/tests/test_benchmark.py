@@ -0,0 +1,93 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import logging
+import time
+from unittest import mock
+
+from odoo.tests.common import tagged
+
+from odoo.addons.queue_job.delay import chain
+from odoo.addons.queue_job.job import ENQUEUED, Job
+
+from .common import JobCommonCase
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged("-standard", "queue_job_benchmark")
+class TestBenchmark(JobCommonCase):
+    """Timings of the storage of the jobs, not run by default
+
+    Run with ``--test-tags queue_job_benchmark``, the timings are logged.
+    """
+
+    def _timed(self, func):
+        """Return the duration of func, its changes are rolled back"""
+        with self.env.cr.savepoint(flush=False) as savepoint:
+            self.env.flush_all()
+            start = time.perf_counter()
+            func()
+            self.env.flush_all()
+            duration = time.perf_counter() - start
+            savepoint.rollback()
+        self.env.invalidate_all()
+        return duration
+
+    def _delay_chain(self, size):
+        delayables = [
+            self.env["test.queue.job"].delayable().testing_method()
+            for __ in range(size)
+        ]
+        chain(*delayables).delay()
+
+    def test_delay_graph(self):
+        def store_one_by_one(jobs):
+            # storage of the jobs of a graph before the multi-record creates
+            for job in jobs:
+                job.store()
+
+        for size in (1000, 10000, 100000):
+            with mock.patch.object(Job, "store_many", new=store_one_by_one):
+                before = self._timed(lambda: self._delay_chain(size))
+            after = self._timed(lambda: self._delay_chain(size))
+            _logger.info(
+                "delay a graph of %d vertices: %.2fs before, %.2fs after (x%.1f)",
+                size,
+                before,
+                after,
+                before / after,
+            )
+
+    def test_load_job_to_run(self):
+        uuids = []
+        for __ in range(1000):
+            record = self._create_job()
+            record.state = ENQUEUED
+            uuids.append(record.uuid)
+        self.env.flush_all()
+
+        def lock_and_load():
+            # loading of the job to run before ``Job.load_for_update``
+            for uuid in uuids:
+                self.env.invalidate_all()
+                self.env.cr.execute(
+                    "SELECT state FROM queue_job WHERE uuid=%s AND state=%s "
+                    "FOR UPDATE",
+                    (uuid, ENQUEUED),
+                )
+                self.env.cr.fetchone()
+                Job.load(self.env, uuid)
+
+        def load_for_update():
+            for uuid in uuids:
+                self.env.invalidate_all()
+                Job.load_for_update(self.env, uuid, state=ENQUEUED)
+
+        before = self._timed(lock_and_load)
+        after = self._timed(load_for_update)
+        _logger.info(
+            "load a job to run: %.3fms before, %.3fms after (x%.1f)",
+            before * 1000 / len(uuids),
+            after * 1000 / len(uuids),
+            before / after,
+        )
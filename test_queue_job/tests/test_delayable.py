@@ -2,6 +2,8 @@
 # Copyright 2019 Guewen Baconnier
 # license lgpl-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 
+from unittest import mock
+
 import odoo.tests.common as common
 
 from odoo.addons.queue_job.delay import (
@@ -11,6 +13,7 @@ from odoo.addons.queue_job.delay import (
     chain,
     group,
 )
+from odoo.addons.queue_job.job import identity_exact
 
 
 class TestDelayable(common.TransactionCase):
@@ -302,3 +305,96 @@ class TestDelayable(common.TransactionCase):
         node.on_done(node2).delay()
         self.assert_generated_job(node, node2)
         self.assert_dependencies({node: {}, node2: {node}})
+
+    def test_delay_graph_stored_by_chunks(self):
+        nodes = [self.job_node(i) for i in range(5)]
+        with mock.patch("odoo.addons.queue_job.job.STORE_CHUNK_SIZE", 2):
+            chain(*nodes).delay()
+        self.assert_generated_job(*nodes)
+        records = self.queue_job.search(
+            [("uuid", "in", [node._generated_job.uuid for node in nodes])]
+        )
+        self.assertEqual(len(records), 5)
+        self.assertEqual(len(set(records.mapped("graph_uuid"))), 1)
+        self.assertEqual(records[0].graph_uuid, nodes[0]._generated_job.graph_uuid)
+        for parent, child in zip(nodes, nodes[1:]):
+            record = child._generated_job.db_record()
+            self.assertEqual(record.state, "wait_dependencies")
+            self.assertEqual(
+                record.dependencies["depends_on"], [parent._generated_job.uuid]
+            )
+        self.assertEqual(nodes[0]._generated_job.db_record().state, "pending")
+
+    def test_delay_graph_all_identities_exist(self):
+        def nodes():
+            return [
+                Delayable(self.test_model, identity_key=identity_exact).testing_method(
+                    i
+                )
+                for i in range(3)
+            ]
+
+        first_nodes = nodes()
+        chain(*first_nodes).delay()
+        existing = [node._generated_job.db_record() for node in first_nodes]
+        count = self.queue_job.search_count([])
+
+        second_nodes = nodes()
+        chain(*second_nodes).delay()
+        self.assertEqual(self.queue_job.search_count([]), count)
+        # every delayable is mapped to the existing job with the same identity
+        self.assertEqual([node._generated_job for node in second_nodes], existing)
+
+    def test_delayable_split(self):
+        records = self.test_model.create([{"name": str(i)} for i in range(5)])
+        delayable = Delayable(records, channel="root.test", priority=15)
+        split = delayable.testing_method(1, foo=2).split(2)
+        self.assertIsInstance(split, DelayableGroup)
+        chunks = sorted(split._delayables, key=lambda node: node.recordset.ids)
+        self.assertEqual(
+            [node.recordset for node in chunks],
+            [records[0:2], records[2:4], records[4:]],
+        )
+        split.on_done(self.job_node(6)).delay()
+        self.assert_generated_job(*chunks)
+        self.assertEqual(
+            sorted(node._generated_job.description for node in chunks),
+            [
+                "Method used for tests (split 1/3)",
+                "Method used for tests (split 2/3)",
+                "Method used for tests (split 3/3)",
+            ],
+        )
+        for node in chunks:
+            job = node._generated_job
+            self.assertEqual(job.args, (1,))
+            self.assertEqual(job.kwargs, {"foo": 2})
+            self.assertEqual(job.channel, "root.test")
+            self.assertEqual(job.priority, 15)
+            self.assertEqual(job.state, "pending")
+
+    def test_delayable_split_chain(self):
+        records = self.test_model.create([{"name": str(i)} for i in range(3)])
+        split = Delayable(records).testing_method().split(1, chain=True)
+        self.assertIsInstance(split, DelayableChain)
+        split.delay()
+        jobs = self.queue_job.search([("name", "like", "(split %/3)")])
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(len(set(jobs.mapped("graph_uuid"))), 1)
+        self.assertEqual(
+            sorted(jobs.mapped("state")),
+            ["pending", "wait_dependencies", "wait_dependencies"],
+        )
+
+    def test_delayable_split_connected(self):
+        records = self.test_model.create([{"name": str(i)} for i in range(3)])
+        delayable = Delayable(records).testing_method()
+        delayable.on_done(self.job_node(1))
+        with self.assertRaisesRegex(ValueError, "connected to other delayables"):
+            delayable.split(1)
+        # split after being put in a chain: the chain cannot be delayed
+        delayable = Delayable(records).testing_method()
+        graph = chain(self.job_node(2), delayable)
+        delayable.split(1)
+        with self.assertRaisesRegex(ValueError, "was split"):
+            graph.delay()
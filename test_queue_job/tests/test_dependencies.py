@@ -126,6 +126,32 @@ class TestJobDependencies(common.TransactionCase):
         # In practice, it won't be an issue for the jobrunner.
         self.assertEqual(Job.load(self.env, job_a.uuid).state, PENDING)
 
+    def test_depends_enqueue_waiting_fan_in(self):
+        parents = [
+            self.env["test.queue.job"].delayable().testing_method(i) for i in range(3)
+        ]
+        child = self.env["test.queue.job"].delayable().testing_method(3)
+        group(*parents).on_done(child).delay()
+        child_record = child._generated_job.db_record()
+        self.assertEqual(child_record.dependencies_remaining, 3)
+        self.assertEqual(
+            self.env["queue.job.dependency"].search_count(
+                [("child_id", "=", child_record.id)]
+            ),
+            3,
+        )
+
+        for remaining, parent in zip((2, 2, 1, 0), parents[:1] + parents):
+            job_ = parent._generated_job
+            job_.set_done()
+            job_.store()
+            # resolving the same parent twice must not decrement the counter
+            job_.enqueue_waiting()
+            self.assertEqual(child_record.dependencies_remaining, remaining)
+            self.assertEqual(
+                child_record.state, PENDING if not remaining else WAIT_DEPENDENCIES
+            )
+
     def test_dependency_graph(self):
         job_root = Job(self.method)
         job_lvl1_a = Job(self.method)
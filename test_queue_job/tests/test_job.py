@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from unittest import mock
 
 import odoo.tests.common as common
+from odoo import exceptions
 
 from odoo.addons.queue_job import identity_exact
 from odoo.addons.queue_job.delay import DelayableGraph
@@ -201,6 +202,60 @@ class TestJobsOnTestingMethod(JobCommonCase):
         stored.invalidate_recordset()
         self.assertEqual(stored.additional_info, "JUST_TESTING_BUT_FAILED")
 
+    def test_store_changed_values(self):
+        test_job = Job(self.method)
+        test_job.store()
+        job_read = Job.load(self.env, test_job.uuid)
+        job_model = type(self.env["queue.job"])
+        with mock.patch.object(
+            job_model, "write", autospec=True
+        ) as write, mock.patch.object(
+            job_model, "_can_write_in_sql", return_value=False
+        ):
+            job_read.store()
+            write.assert_not_called()
+            job_read.set_started()
+            job_read.store()
+            vals = write.call_args[0][1]
+            self.assertEqual(set(vals), {"state", "date_started", "worker_pid"})
+
+    def test_store_changed_values_other_cursor(self):
+        test_job = Job(self.method)
+        test_job.store()
+        record = test_job.db_record()
+        test_job.set_started()
+        self.assertEqual(
+            set(test_job._changed_store_values(record)),
+            {"state", "date_started", "worker_pid"},
+        )
+        # the values stored may have been rolled back
+        with self.registry.cursor() as new_cr:
+            test_job.env = test_job.env(cr=new_cr)
+            vals = test_job._changed_store_values(record)
+            test_job.env = self.env
+        self.assertEqual(set(vals), set(test_job._store_values()))
+
+    def test_store_state_in_sql(self):
+        test_job = Job(self.method)
+        test_job.store()
+        job_model = type(self.env["queue.job"])
+        with mock.patch.object(
+            job_model, "_has_write_override", return_value=False
+        ), mock.patch.object(job_model, "write", autospec=True) as write:
+            test_job.set_started()
+            test_job.store()
+            test_job.set_done(result="ok")
+            test_job.store()
+            write.assert_not_called()
+            record = test_job.db_record()
+            self.assertEqual(record.state, DONE)
+            self.assertEqual(record.result, "ok")
+            self.assertTrue(record.date_done)
+            # failures post a message, they go through the ORM
+            test_job.set_failed(exc_info="Traceback", exc_name="ValueError")
+            test_job.store()
+            write.assert_called_once()
+
     def test_read(self):
         eta = datetime.now() + timedelta(hours=5)
         test_job = Job(
@@ -254,6 +309,35 @@ class TestJobsOnTestingMethod(JobCommonCase):
         self.assertAlmostEqual(job_read.date_done, test_date, delta=delta)
         self.assertAlmostEqual(job_read.exec_time, 0.0)
 
+    def test_load_for_update(self):
+        test_job = Job(self.method, args=("o", "k"), kwargs={"c": "!"}, priority=15)
+        test_job.store()
+        self.assertIsNone(Job.load_for_update(self.env, test_job.uuid, state=DONE))
+
+        def count_queries(load):
+            self.env.invalidate_all()
+            count = self.cr.sql_log_count
+            job_ = load(self.env, test_job.uuid)
+            return job_, self.cr.sql_log_count - count
+
+        count_queries(Job.load)  # warm up the caches
+        job_read, load_count = count_queries(Job.load)
+        job_locked, lock_count = count_queries(Job.load_for_update)
+        self.assertLess(lock_count, load_count)
+        for name in (
+            "uuid",
+            "args",
+            "kwargs",
+            "priority",
+            "state",
+            "company_id",
+            "date_created",
+            "recordset",
+            "description",
+        ):
+            self.assertEqual(getattr(job_locked, name), getattr(job_read, name))
+        self.assertEqual(job_locked._stored_values, job_read._stored_values)
+
     def test_job_unlinked(self):
         test_job = Job(self.method, args=("o", "k"), kwargs={"c": "!"})
         test_job.store()
@@ -428,6 +512,97 @@ class TestJobs(JobCommonCase):
         job_2 = rec1.with_delay(identity_key=id_key).mapped("name")
         self.assertEqual(job_2.uuid, job_1.uuid)
 
+    def test_job_identity_key_unique_index(self):
+        """With a unique index, enqueuing an existing identity key returns it"""
+        self.env["queue.job"]._init_identity_key_unique_index()
+        self.env.registry.clear_caches()
+        self.addCleanup(self.env.registry.clear_caches)
+        id_key = "e294e8444453b09d59bdb6efbfec1323"
+        rec1 = self.env["test.queue.job"].create({"name": "test1"})
+        job_1 = rec1.with_delay(identity_key=id_key).mapped("name")
+        self.assertTrue(job_1.existing_identity_record is None)
+        job_2 = rec1.with_delay(identity_key=id_key).mapped("name")
+        self.assertEqual(job_2.uuid, job_1.uuid)
+        self.assertEqual(
+            self.env["queue.job"].search_count([("identity_key", "=", id_key)]), 1
+        )
+        # a retried job keeps its key
+        job_1.db_record().retry = 1
+        job_2 = rec1.with_delay(identity_key=id_key).mapped("name")
+        self.assertEqual(job_2.uuid, job_1.uuid)
+        # a failed job with the same key cannot be requeued
+        job_1.db_record().state = "failed"
+        job_3 = rec1.with_delay(identity_key=id_key).mapped("name")
+        self.assertNotEqual(job_3.uuid, job_1.uuid)
+        with self.assertRaisesRegex(exceptions.UserError, id_key):
+            job_1.db_record().requeue()
+        self.assertEqual(job_1.db_record().state, "failed")
+
+    def test_job_coalesce(self):
+        """Pending jobs of a function are executed with the coalesced job"""
+        self.env["queue.job.function"].create(
+            {
+                "model_id": self.env.ref("test_queue_job.model_test_queue_job").id,
+                "method": "mapped",
+                "coalesce_limit": 3,
+            }
+        )
+        records = self.env["test.queue.job"].create(
+            [{"name": "test%d" % i} for i in range(4)]
+        )
+        # enqueued first, but not executed with the others: the environment
+        # of its records differs
+        other_context = (
+            records[3].with_context(tz="Europe/Brussels").with_delay().mapped("name")
+        )
+        jobs = [record.with_delay().mapped("name") for record in records]
+        other_args = records[0].with_delay().mapped("display_name")
+        self.env["queue.job"].flush_model()
+
+        job_ = Job.load(self.env, jobs[0].uuid)
+        coalesced = job_.coalesce()
+        self.assertEqual(
+            sorted(coalesced_job.uuid for coalesced_job in coalesced),
+            sorted(j.uuid for j in jobs[1:3]),
+        )
+        job_.set_started()
+        job_.store()
+        self.assertEqual(sorted(job_.perform()), ["test0", "test1", "test2"])
+        job_.set_done()
+        job_.store()
+        for coalesced_job in jobs[:3]:
+            self.assertEqual(coalesced_job.db_record().state, DONE)
+        self.assertEqual(jobs[3].db_record().state, PENDING)
+        self.assertEqual(other_args.db_record().state, PENDING)
+        self.assertEqual(other_context.db_record().state, PENDING)
+
+    def test_job_debounce(self):
+        """Enqueuing a job with a debounce postpones the pending job"""
+        job_function = self.env.ref(
+            "test_queue_job.job_function_test_queue_job_testing_method"
+        )
+        job_function.debounce_max_delay = 100
+        id_key = "e294e8444453b09d59bdb6efbfec1323"
+        model = self.env["test.queue.job"]
+        now = datetime.now().replace(microsecond=0)
+        job_1 = model.with_delay(identity_key=id_key, debounce=60).testing_method()
+        record = job_1.db_record()
+        self.assertGreaterEqual(record.eta, now + timedelta(seconds=59))
+        record.write({"eta": now, "date_created": now - timedelta(seconds=80)})
+
+        job_2 = model.with_delay(identity_key=id_key, debounce=60).testing_method()
+        self.assertEqual(job_2, record)
+        # the debounce cannot postpone the job beyond the max. delay
+        self.assertEqual(record.eta, now + timedelta(seconds=20))
+
+        record.eta = False
+        job_function.debounce_window = 30
+        model.with_delay(identity_key=id_key).testing_method()
+        self.assertEqual(record.eta, now + timedelta(seconds=20))
+        self.assertEqual(
+            self.env["queue.job"].search_count([("identity_key", "=", id_key)]), 1
+        )
+
     def test_job_with_mutable_arguments(self):
         """Job with mutable arguments do not mutate on perform()"""
         delayable = self.env["test.queue.job"].with_delay()
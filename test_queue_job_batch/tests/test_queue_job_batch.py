@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 from odoo.tests.common import TransactionCase
 
 from odoo.addons.queue_job.job import Job
@@ -64,3 +66,25 @@ class TestQueueJobGroup(TransactionCase):
         self.assertEqual(batch.state, "finished")
         self.assertEqual(batch.completeness, 1)
         self.assertFalse(batch.is_read)
+
+    def test_batch_archived_jobs(self):
+        batch = self.env["queue.job.batch"].get_new_batch("TEST")
+        model = self.env["test.queue.job"].with_context(job_batch=batch)
+        job_1 = model.with_delay().testing_method()
+        job_2 = model.with_delay().testing_method()
+        date_done = datetime.now() - timedelta(days=1)
+        job_1.db_record().write({"state": "done", "date_done": date_done})
+        self.env["queue.job.archive"].archive_jobs()
+        batch.invalidate_recordset()
+        self.assertEqual(batch.job_ids, job_2.db_record())
+        self.assertEqual(batch.archived_job_ids.uuid, job_1.uuid)
+        self.assertEqual(batch.job_count, 2)
+        self.assertEqual(batch.archived_job_count, 1)
+        self.assertEqual(batch.completeness, 0.5)
+        batch.enqueue()
+        self.assertEqual(batch.state, "progress")
+        job = Job.load(self.env, job_2.uuid)
+        job.set_done()
+        job.store()
+        batch.check_state()
+        self.assertEqual(batch.state, "finished")